@@ -0,0 +1,50 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+from files.downloads import aiter_file
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that also runs natively under ASGI.
+
+    WhiteNoise is sync-only, so Django's ASGI handler would run it, and the
+    rest of every request behind it, in a thread. Finding a static file is
+    a dict lookup; only the body needs reading without blocking, which the
+    async path does with the same iterator as async downloads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.aserve(static_file, request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def aserve(static_file, request):
+        response = static_file.get_response(request.method, request.META)
+        if response.file is None:
+            http_response = HttpResponse(status=int(response.status))
+        else:
+            http_response = StreamingHttpResponse(aiter_file(response.file), status=int(response.status))
+        # The content type comes from WhiteNoise's headers
+        del http_response['Content-Type']
+        for key, value in response.headers:
+            http_response[key] = value
+        return http_response
@@ -46,7 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
   "django.middleware.security.SecurityMiddleware",
-  "whitenoise.middleware.WhiteNoiseMiddleware",
+  "core.middleware.AsyncWhiteNoiseMiddleware",
   "django.contrib.sessions.middleware.SessionMiddleware",
   "corsheaders.middleware.CorsMiddleware",
   "django.middleware.common.CommonMiddleware",
@@ -80,11 +80,48 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-  "default": {
-    "ENGINE": "django.db.backends.sqlite3",
-    "NAME": "/app/data/db.sqlite3",
+# SQLite by default; DATABASE_ENGINE=postgresql switches to PostgreSQL
+# (install psycopg). Connections persist for DB_CONN_MAX_AGE seconds.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DATABASE_ENGINE == 'postgresql':
+  DATABASES = {
+    "default": {
+      "ENGINE": "django.db.backends.postgresql",
+      "NAME": os.environ.get('POSTGRES_DB', 'filevault'),
+      "USER": os.environ.get('POSTGRES_USER', 'filevault'),
+      "PASSWORD": os.environ.get('POSTGRES_PASSWORD', ''),
+      "HOST": os.environ.get('POSTGRES_HOST', 'localhost'),
+      "PORT": os.environ.get('POSTGRES_PORT', '5432'),
+      "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+      "CONN_HEALTH_CHECKS": True,
+    }
   }
+else:
+  DATABASES = {
+    "default": {
+      "ENGINE": "django.db.backends.sqlite3",
+      "NAME": os.environ.get('SQLITE_PATH', '/app/data/db.sqlite3'),
+      "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+      "CONN_HEALTH_CHECKS": True,
+      # A file rather than in-memory, so the concurrency tests' threads
+      # each get a real connection to the same test database
+      "TEST": {
+        "NAME": os.environ.get('SQLITE_TEST_PATH', '/tmp/filevault_test.sqlite3'),
+      },
+    }
+  }
+
+# Applied to every new SQLite connection (files/db.py). WAL lets readers run
+# alongside the single writer, and busy_timeout (ms) makes writers wait for
+# the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+  'journal_mode': 'WAL',
+  'synchronous': 'NORMAL',
+  'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+  'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+  'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024)),
 }
 
 
@@ -130,6 +167,31 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Delete uploaded files when a process exits (demo setups only)
+CLEANUP_MEDIA_ON_EXIT = os.environ.get('CLEANUP_MEDIA_ON_EXIT', 'False') == 'True'
+
+# Stream uploads into MEDIA_ROOT/uploads/.staging, hashing them on the way in
+FILE_UPLOAD_HANDLERS = [
+    'files.uploads.HashingFileUploadHandler',
+]
+
+# Files accepted in one multipart request; this caps a /files/batch/ upload
+DATA_UPLOAD_MAX_NUMBER_FILES = int(os.environ.get('DATA_UPLOAD_MAX_NUMBER_FILES', 100))
+
+# Content hash used for deduplication: sha256, md5, or blake3/xxh3 when installed
+FILE_HASH_ALGORITHM = os.environ.get('FILE_HASH_ALGORITHM', 'sha256')
+# Threads used to compute digests (defaults to the CPU count)
+FILE_HASH_THREADS = int(os.environ.get('FILE_HASH_THREADS', 0)) or None
+
+# Resumable upload sessions: default part size (bytes) and lifetime (seconds)
+UPLOAD_SESSION_PART_SIZE = int(os.environ.get('UPLOAD_SESSION_PART_SIZE', 8 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+# Largest file (bytes) an upload session accepts
+UPLOAD_SESSION_MAX_SIZE = int(os.environ.get('UPLOAD_SESSION_MAX_SIZE', 16 * 1024 * 1024 * 1024))
+# Staged uploads (MEDIA_ROOT/uploads/.staging) not written to for this many
+# seconds are removed by cleanup_upload_sessions
+UPLOAD_STAGING_MAX_AGE = int(os.environ.get('UPLOAD_STAGING_MAX_AGE', 24 * 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -142,7 +204,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
-        'rest_framework.parsers.MultiPartParser',
+        'files.uploads.StagingMultiPartParser',
         'rest_framework.parsers.FormParser',
     ],
 }
@@ -190,6 +252,46 @@ LOGGING = {
     },
 }
 
+# How /files/<id>/download/ sends bytes: 'django' streams them with FileResponse
+# (os.sendfile under gunicorn), 'nginx' hands off via X-Accel-Redirect to an
+# internal location mapped to MEDIA_ROOT, 'sendfile' via X-Sendfile
+FILE_DOWNLOAD_BACKEND = os.environ.get('FILE_DOWNLOAD_BACKEND', 'django')
+FILE_DOWNLOAD_ACCEL_PREFIX = os.environ.get('FILE_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
+# Serve search and download from the native async views in files/async_views.py
+# (set by start.sh when running under uvicorn; has no effect under WSGI)
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+# Cache shared by all worker processes (search results, counts, counters):
+# Redis when REDIS_URL is set, otherwise files on local disk
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', '/tmp/file_vault_cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+            },
+        }
+    }
+
+# Seconds a worker process batches search cache hit/miss counts before
+# adding them to the shared counters in one UPDATE
+SEARCH_CACHE_STATS_FLUSH_INTERVAL = float(os.environ.get('SEARCH_CACHE_STATS_FLUSH_INTERVAL', 10))
+
+# Search telemetry: fraction of searches logged at INFO, and the duration
+# (ms) above which every search is logged as a warning
+SEARCH_LOG_SAMPLE_RATE = float(os.environ.get('SEARCH_LOG_SAMPLE_RATE', 0.01))
+SEARCH_SLOW_QUERY_MS = float(os.environ.get('SEARCH_SLOW_QUERY_MS', 500))
+
 # Elasticsearch configuration
 ELASTICSEARCH_DSN = os.environ.get('ELASTICSEARCH_DSN', 'http://localhost:9200')
 
@@ -198,3 +300,13 @@ ELASTICSEARCH_DSL = {
         'hosts': ELASTICSEARCH_DSN
     },
 }
+
+# Index updates go through the IndexOutbox table (files.signals) instead of
+# django_elasticsearch_dsl's synchronous signal processor
+ELASTICSEARCH_DSL_AUTOSYNC = False
+
+# Outbox worker (process_index_outbox): tasks per _bulk request, idle poll
+# interval in seconds, and the retry backoff ceiling in seconds
+SEARCH_INDEX_BATCH_SIZE = int(os.environ.get('SEARCH_INDEX_BATCH_SIZE', 500))
+SEARCH_INDEX_POLL_INTERVAL = float(os.environ.get('SEARCH_INDEX_POLL_INTERVAL', 1.0))
+SEARCH_INDEX_MAX_BACKOFF = int(os.environ.get('SEARCH_INDEX_MAX_BACKOFF', 300))
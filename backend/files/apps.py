@@ -9,10 +9,12 @@ class FilesConfig(AppConfig):
   name = "files"
 
   def ready(self):
-    # Only register cleanup if we're not in a test environment
-    if not os.environ.get('DJANGO_TEST'):
+    # Wiping uploads on exit is opt-in: it runs in every process, including
+    # management commands, and would destroy the vault's content
+    if settings.CLEANUP_MEDIA_ON_EXIT and not os.environ.get('DJANGO_TEST'):
       atexit.register(self.cleanup_files)
     import files.signals  # Import signals
+    import files.db  # SQLite connection pragmas
 
   def cleanup_files(self):
     """Clean up uploaded files when the application shuts down"""
@@ -20,15 +22,20 @@ class FilesConfig(AppConfig):
       # Get the path to the media directory
       media_path = settings.MEDIA_ROOT
       if os.path.exists(media_path):
-        # Remove all files in the uploads directory
+        # Remove all files under the uploads directory, including the
+        # sharded uploads/ab/cd/<hash> blobs, then the emptied directories
         uploads_path = os.path.join(media_path, 'uploads')
-        if os.path.exists(uploads_path):
-          for filename in os.listdir(uploads_path):
-            file_path = os.path.join(uploads_path, filename)
+        for dirpath, dirnames, filenames in os.walk(uploads_path, topdown=False):
+          for filename in filenames:
+            file_path = os.path.join(dirpath, filename)
             try:
-              if os.path.isfile(file_path):
-                os.unlink(file_path)
+              os.unlink(file_path)
             except Exception as e:
               print(f"Error deleting {file_path}: {e}")
+          if dirpath != uploads_path:
+            try:
+              os.rmdir(dirpath)
+            except OSError:
+              pass
     except Exception as e:
       print(f"Error during cleanup: {e}")
@@ -0,0 +1,102 @@
+"""
+Native async views for the read paths, routed ahead of the DRF viewset
+when ASYNC_VIEWS is enabled and the app is served over ASGI. A worker
+waiting on Elasticsearch or streaming a download yields the event loop
+instead of holding a thread.
+"""
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from elasticsearch_dsl import AsyncSearch, async_connections
+from rest_framework.utils.encoders import JSONEncoder
+from .documents import FileDocument
+from .downloads import serve_file
+from .models import File
+from .search_cache import get_search_cache_version, record_search_cache_lookup
+from .views import FilePagination, build_file_search, log_search, serialize_search_hits
+
+logger = logging.getLogger('files')
+
+# Set on first use: True when an AsyncElasticsearch client could be created
+_async_search_available = None
+
+def async_search_available():
+    """
+    Configure the async Elasticsearch connection once. The async transport
+    needs aiohttp; without it searches run the sync client in a thread.
+    """
+    global _async_search_available
+    if _async_search_available is None:
+        try:
+            async_connections.configure(**settings.ELASTICSEARCH_DSL)
+            async_connections.get_connection()
+            _async_search_available = True
+        except (ImportError, ValueError) as e:
+            logger.warning(f"Async Elasticsearch client unavailable, searching in a thread: {e}")
+            _async_search_available = False
+    return _async_search_available
+
+async def execute_search(query, file_type, page, page_size):
+    if async_search_available():
+        search = build_file_search(AsyncSearch(index=FileDocument._index._name), query, file_type, page, page_size)
+        return await search.execute()
+    search = build_file_search(FileDocument.search(), query, file_type, page, page_size)
+    return await sync_to_async(search.execute, thread_sensitive=False)()
+
+async def search_files(request):
+    """Async counterpart of FileViewSet.search, with the same parameters and response"""
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+    started = time.monotonic()
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({
+            'error': 'Search query parameter "q" is required'
+        }, status=400)
+    query = query.lower()
+
+    file_type = request.GET.get('file_type', '')
+    page = request.GET.get('page', 1)
+    page_size = request.GET.get('page_size', FilePagination.page_size)
+    cache_version = await sync_to_async(get_search_cache_version)()
+    cache_key = f'search_{query}_{file_type}_{page}_{page_size}_v{cache_version}'
+
+    cached_results = await cache.aget(cache_key)
+    await sync_to_async(record_search_cache_lookup)(hit=bool(cached_results))
+    if cached_results:
+        log_search(query, file_type, page, page_size, (time.monotonic() - started) * 1000,
+                   hits=cached_results['total'], cache_hit=True)
+        return JsonResponse(cached_results, encoder=JSONEncoder)
+
+    response = await execute_search(query, file_type, int(page), int(page_size))
+    total = response.hits.total.value
+
+    # Hits indexed without the stored file fields need the database
+    files = await sync_to_async(serialize_search_hits)(response, {'request': request})
+
+    response_data = {
+        'files': files,
+        'total': total,
+        'query': query,
+        'page': int(page),
+        'page_size': int(page_size)
+    }
+    await cache.aset(cache_key, response_data, timeout=300)
+
+    log_search(query, file_type, page, page_size, (time.monotonic() - started) * 1000,
+               took_ms=response.took, hits=total)
+    return JsonResponse(response_data, encoder=JSONEncoder)
+
+async def download_file(request, file_id):
+    """Async counterpart of FileViewSet.download"""
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+    file_record = await File.objects.select_related('stored_file').filter(pk=file_id).afirst()
+    if file_record is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return serve_file(request, file_record, asynchronous=True)
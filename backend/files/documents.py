@@ -1,14 +1,63 @@
+import re
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
-from .models import File
+from elasticsearch_dsl import analyzer, token_filter, tokenizer
+from .models import File, StoredFile
+
+# Split filenames into words on whitespace, dots, underscores and dashes
+FILENAME_WORD_BOUNDARY = re.compile(r'[\s._\-]+')
+filename_tokenizer = tokenizer('filename_tokenizer', 'pattern', pattern=FILENAME_WORD_BOUNDARY.pattern)
+
+# Whole-word matching: "Q3_Report.PDF" -> q3, report, pdf
+filename_analyzer = analyzer(
+    'filename',
+    tokenizer=filename_tokenizer,
+    filter=['lowercase', 'asciifolding'],
+)
+
+# Prefix matching on every word: report -> r, re, rep, ...
+filename_prefix_analyzer = analyzer(
+    'filename_prefix',
+    tokenizer=filename_tokenizer,
+    filter=[
+        'lowercase',
+        'asciifolding',
+        token_filter('filename_edge_ngram', 'edge_ngram', min_gram=1, max_gram=20),
+    ],
+)
+
+# Type-ahead: each completion input is matched by prefix as a whole
+filename_completion_analyzer = analyzer(
+    'filename_completion',
+    tokenizer='keyword',
+    filter=['lowercase', 'asciifolding'],
+)
+
+# Substring matching anywhere in the name, replacing *query* wildcards
+filename_trigram_analyzer = analyzer(
+    'filename_trigram',
+    tokenizer=tokenizer('filename_trigram_tokenizer', 'ngram', min_gram=3, max_gram=3),
+    filter=['lowercase', 'asciifolding'],
+)
 
 @registry.register_document
 class FileDocument(Document):
-    original_filename = fields.TextField()
-    file_type = fields.TextField()
-    size = fields.IntegerField()
+    original_filename = fields.TextField(
+        analyzer=filename_analyzer,
+        fields={
+            'prefix': fields.TextField(analyzer=filename_prefix_analyzer, search_analyzer=filename_analyzer),
+            'trigram': fields.TextField(analyzer=filename_trigram_analyzer),
+        }
+    )
+    file_type = fields.KeywordField()
+    suggest = fields.CompletionField(analyzer=filename_completion_analyzer)
+    size = fields.LongField()
     file_hash = fields.TextField()
     uploaded_at = fields.DateField()
+    # Stored content details, so search results are built from _source alone
+    stored_file_id = fields.KeywordField()
+    stored_file_created_at = fields.DateField()
+    file_path = fields.KeywordField(index=False)
 
     class Index:
         name = 'files'
@@ -19,12 +68,38 @@ class FileDocument(Document):
 
     class Django:
         model = File
+        related_models = [StoredFile]
 
-    def prepare_original_filename(self, instance):
-        return instance.original_filename.lower()
+    def get_queryset(self):
+        """Fetch stored_file in the same query so preparing a document never hits the DB again"""
+        return super().get_queryset().select_related('stored_file')
+
+    def get_instances_from_related(self, related_instance):
+        """Files whose documents change when their StoredFile does"""
+        if isinstance(related_instance, StoredFile):
+            return related_instance.file_records.select_related('stored_file')
+
+    def prepare_suggest(self, instance):
+        # Offer the name from every word boundary, so "rep" completes "Q3_Report.pdf"
+        name = instance.original_filename
+        inputs = [name]
+        for match in FILENAME_WORD_BOUNDARY.finditer(name):
+            if match.end() < len(name):
+                inputs.append(name[match.end():])
+        return {'input': inputs}
 
     def prepare_size(self, instance):
-        return instance.stored_file.file.size
+        # File.size is recorded at upload, so indexing never stats the blob
+        return instance.size
 
     def prepare_file_hash(self, instance):
-        return instance.stored_file.file_hash 
\ No newline at end of file
+        return instance.stored_file.file_hash if instance.stored_file_id else None
+
+    def prepare_stored_file_id(self, instance):
+        return str(instance.stored_file_id) if instance.stored_file_id else None
+
+    def prepare_stored_file_created_at(self, instance):
+        return instance.stored_file.created_at if instance.stored_file_id else None
+
+    def prepare_file_path(self, instance):
+        return instance.stored_file.file.name if instance.stored_file_id else None
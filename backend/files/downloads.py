@@ -0,0 +1,185 @@
+import logging
+import os
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+logger = logging.getLogger('files')
+
+# Read size when the bytes are copied in Python (no wsgi.file_wrapper sendfile)
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+# A file's content never changes, so clients may cache it indefinitely
+DOWNLOAD_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of an open file starting at `start`.
+
+    It keeps fileno(), so gunicorn's wsgi.file_wrapper still serves it
+    with os.sendfile: the kernel copies from the current offset for the
+    response's Content-Length bytes.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+async def aiter_file(file, block_size=DOWNLOAD_BLOCK_SIZE):
+    """Yield a file's bytes, reading each block in a worker thread"""
+    try:
+        while True:
+            chunk = await sync_to_async(file.read, thread_sensitive=False)(block_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+def get_etag(stored_file):
+    """Strong ETag derived from the content hash"""
+    return f'"{stored_file.hash_algorithm}-{stored_file.file_hash}"'
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header into an inclusive (start, end) pair.
+    Returns None to serve the whole file (no header, unsupported or
+    multiple ranges), or 'unsatisfiable' for a range outside the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        start, end = max(size - length, 0), size - 1
+
+    if start >= size:
+        return 'unsatisfiable'
+    return start, end
+
+def content_not_found(file_record, reason):
+    """404 for a File whose content is gone; the reference is logged, since it should not happen"""
+    logger.error(f"Dangling content reference for file {file_record.id} ({file_record.original_filename}): {reason}")
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+def serve_file(request, file_record, asynchronous=False):
+    """
+    Serve a File's content, honouring If-None-Match, If-Range and Range.
+    With FILE_DOWNLOAD_BACKEND set to 'nginx' or 'sendfile' the transfer is
+    handed to the front proxy; otherwise FileResponse streams it, using
+    os.sendfile when the WSGI server provides wsgi.file_wrapper.
+
+    With asynchronous=True (ASGI views) the body is an async iterator:
+    Django's ASGI handler would otherwise read a FileResponse into memory
+    in a thread before sending it.
+
+    A File without a stored file, or whose blob is missing, gets a 404.
+    """
+    stored_file = file_record.stored_file
+    if stored_file is None:
+        return content_not_found(file_record, 'no stored file')
+    etag = get_etag(stored_file)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': DOWNLOAD_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    backend = settings.FILE_DOWNLOAD_BACKEND
+    if backend in ('nginx', 'sendfile'):
+        # The proxy serves the bytes (and any Range) itself
+        response = HttpResponse(content_type=file_record.file_type)
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + stored_file.file.name
+        else:
+            response['X-Sendfile'] = stored_file.file.path
+        response['Content-Disposition'] = content_disposition_header(True, file_record.original_filename)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    try:
+        file = open(stored_file.file.path, 'rb')
+    except FileNotFoundError:
+        return content_not_found(file_record, f'{stored_file.file.name} does not exist')
+
+    size = stored_file.size or os.fstat(file.fileno()).st_size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range.strip() == etag:
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range == 'unsatisfiable':
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    if asynchronous:
+        start, end = byte_range or (0, size - 1)
+        body = file if byte_range is None else RangeFile(file, start, end - start + 1)
+        response = StreamingHttpResponse(aiter_file(body), content_type=file_record.file_type,
+                                         status=200 if byte_range is None else 206)
+        response['Content-Disposition'] = content_disposition_header(True, file_record.original_filename)
+        response['Content-Length'] = end - start + 1
+        if byte_range is not None:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    elif byte_range is None:
+        response = FileResponse(file, as_attachment=True, filename=file_record.original_filename,
+                                content_type=file_record.file_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), as_attachment=True,
+                                filename=file_record.original_filename, content_type=file_record.file_type,
+                                status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response.block_size = DOWNLOAD_BLOCK_SIZE
+    for name, value in headers.items():
+        response[name] = value
+    return response
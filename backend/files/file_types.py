@@ -0,0 +1,75 @@
+from django.db.models import Case, PositiveSmallIntegerField, Value, When
+
+# List of known MIME types and their extensions. A type's category is its
+# position in this list (starting at 1) and is stored on every File, so new
+# types must be appended, never inserted or reordered.
+KNOWN_FILE_TYPES = {
+    'application/pdf': ['.pdf'],
+    'image/png': ['.png'],
+    'image/jpeg': ['.jpg', '.jpeg'],
+    'image/gif': ['.gif'],
+    'text/plain': ['.txt'],
+    'text/x-python': ['.py'],
+    'application/json': ['.json'],
+    'text/csv': ['.csv'],
+    'text/markdown': ['.md'],
+    'application/parquet': ['.parquet'],
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
+    'application/vnd.ms-excel': ['.xls'],
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx'],
+    'application/msword': ['.doc'],
+    'application/vnd.ms-powerpoint': ['.ppt'],
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation': ['.pptx'],
+    'application/zip': ['.zip'],
+    'application/x-rar-compressed': ['.rar'],
+    'application/x-7z-compressed': ['.7z'],
+    'application/x-tar': ['.tar'],
+    'application/gzip': ['.gz'],
+    'text/html': ['.html', '.htm'],
+    'text/css': ['.css'],
+    'application/javascript': ['.js'],
+    'application/typescript': ['.ts'],
+    'text/x-java-source': ['.java'],
+    'text/x-c': ['.c'],
+    'text/x-c++': ['.cpp'],
+    'text/x-c-header': ['.h'],
+    'text/x-c++-header': ['.hpp'],
+    'text/x-go': ['.go'],
+    'text/x-rust': ['.rs'],
+    'text/x-ruby': ['.rb'],
+    'text/x-php': ['.php'],
+    'text/x-shellscript': ['.sh'],
+    'application/x-msdos-program': ['.bat'],
+    'application/x-powershell': ['.ps1'],
+    'application/sql': ['.sql'],
+    'application/x-yaml': ['.yaml', '.yml'],
+    'application/toml': ['.toml']
+}
+
+# Category of files whose type is not in KNOWN_FILE_TYPES
+CATEGORY_OTHER = 0
+
+# Lookup tables, built once at import
+EXTENSION_MIME_TYPES = {
+    extension.lower(): mime_type
+    for mime_type, extensions in KNOWN_FILE_TYPES.items()
+    for extension in extensions
+}
+MIME_TYPE_CATEGORIES = {mime_type: position for position, mime_type in enumerate(KNOWN_FILE_TYPES, start=1)}
+CATEGORY_MIME_TYPES = {category: mime_type for mime_type, category in MIME_TYPE_CATEGORIES.items()}
+
+def get_mime_type_from_extension(extension):
+    """Get MIME type from file extension"""
+    return EXTENSION_MIME_TYPES.get(extension.lower(), 'application/octet-stream')
+
+def get_file_category(mime_type):
+    """Small integer category stored on File for indexed type filtering"""
+    return MIME_TYPE_CATEGORIES.get(mime_type, CATEGORY_OTHER)
+
+def category_expression():
+    """CASE expression mapping file_type to its category, for set-based backfills"""
+    return Case(
+        *[When(file_type=mime_type, then=Value(category)) for mime_type, category in MIME_TYPE_CATEGORIES.items()],
+        default=Value(CATEGORY_OTHER),
+        output_field=PositiveSmallIntegerField(),
+    )
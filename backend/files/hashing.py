@@ -0,0 +1,86 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+# Algorithms that are always available. hashlib releases the GIL while
+# digesting buffers larger than 2 KiB, so these parallelise across threads.
+HASH_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha256': hashlib.sha256,
+}
+
+# Optional, faster backends; registered only when their package is installed
+try:
+    import blake3
+    HASH_ALGORITHMS['blake3'] = lambda: blake3.blake3(max_threads=blake3.blake3.AUTO)
+except ImportError:
+    pass
+
+try:
+    import xxhash
+    HASH_ALGORITHMS['xxh3'] = xxhash.xxh3_128
+except ImportError:
+    pass
+
+# Algorithm used by rows created before hash_algorithm existed
+LEGACY_HASH_ALGORITHM = 'md5'
+
+# Read size when hashing a file that is already on disk
+HASH_READ_SIZE = 1024 * 1024
+
+_executor = None
+
+def get_hash_algorithm():
+    """Return the configured algorithm for new content"""
+    algorithm = getattr(settings, 'FILE_HASH_ALGORITHM', 'sha256')
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm} (available: {', '.join(HASH_ALGORITHMS)})")
+    return algorithm
+
+def get_executor():
+    """Return the shared thread pool that digests are computed on"""
+    global _executor
+    if _executor is None:
+        max_workers = getattr(settings, 'FILE_HASH_THREADS', None) or os.cpu_count()
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='file-hash')
+    return _executor
+
+class IncrementalHasher:
+    """
+    Feeds chunks to a digest on the shared thread pool.
+
+    Each update waits only for the previous chunk, so hashing chunk N
+    overlaps with the caller reading and writing chunk N+1.
+    """
+
+    def __init__(self, algorithm=None):
+        self.algorithm = algorithm or get_hash_algorithm()
+        self._hasher = HASH_ALGORITHMS[self.algorithm]()
+        self._pending = None
+
+    def update(self, data):
+        if self._pending is not None:
+            self._pending.result()
+        self._pending = get_executor().submit(self._hasher.update, data)
+
+    def hexdigest(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+        return self._hasher.hexdigest()
+
+def calculate_file_hash(file_obj, algorithm=None):
+    """Calculate the content hash of an uploaded file"""
+    hasher = IncrementalHasher(algorithm)
+    for chunk in file_obj.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+def calculate_path_hash(path, algorithm=None):
+    """Calculate the content hash of a file on disk"""
+    hasher = IncrementalHasher(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
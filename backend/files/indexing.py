@@ -0,0 +1,124 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import bulk
+from .documents import FileDocument
+from .models import File, IndexOutbox
+from .search_cache import invalidate_search_cache
+
+logger = logging.getLogger('files')
+
+# While rebuild_index loads a new index version it sits behind this extra
+# alias, and the worker applies every batch to it as well as to the live
+# alias, so changes made during the load are not lost at the swap
+REBUILD_ALIAS_SUFFIX = '-rebuild'
+
+def enqueue(file_ids, action=IndexOutbox.ACTION_INDEX):
+    """Record index mutations for the given File ids"""
+    IndexOutbox.objects.bulk_create([
+        IndexOutbox(file_id=file_id, action=action) for file_id in file_ids
+    ])
+
+def get_rebuild_alias(alias):
+    return f'{alias}{REBUILD_ALIAS_SUFFIX}'
+
+def get_rebuild_indices(client, alias):
+    """Index versions that rebuild_index is currently loading"""
+    try:
+        return list(client.indices.get_alias(name=get_rebuild_alias(alias)).keys())
+    except NotFoundError:
+        return []
+
+def get_retry_delay(attempts):
+    """Exponential backoff for a failing task, capped at SEARCH_INDEX_MAX_BACKOFF"""
+    return timedelta(seconds=min(2 ** attempts, settings.SEARCH_INDEX_MAX_BACKOFF))
+
+def build_actions(latest):
+    """
+    Turn the latest task per file into bulk actions. Index actions for
+    files that no longer exist become deletes, so replaying the outbox
+    always converges on the database state.
+    """
+    index_ids = [file_id for file_id, task in latest.items() if task.action == IndexOutbox.ACTION_INDEX]
+    files = File.objects.select_related('stored_file').in_bulk(index_ids)
+
+    document = FileDocument()
+    actions = {}
+    for file_id in latest:
+        instance = files.get(file_id)
+        if instance is not None:
+            actions[file_id] = document._prepare_action(instance, 'index')
+        else:
+            actions[file_id] = {'_op_type': 'delete', '_index': document._index._name, '_id': str(file_id)}
+    return actions
+
+def process_batch(batch_size=None):
+    """
+    Send up to `batch_size` due tasks to Elasticsearch in one _bulk request.
+    Returns the number of tasks taken from the outbox.
+    """
+    batch_size = batch_size or settings.SEARCH_INDEX_BATCH_SIZE
+    tasks = list(IndexOutbox.objects.filter(available_at__lte=timezone.now()).order_by('id')[:batch_size])
+    if not tasks:
+        return 0
+
+    # Only the most recent task per file matters; older ones are superseded
+    latest = {}
+    for task in tasks:
+        latest[task.file_id] = task
+
+    actions = build_actions(latest)
+    failed = {}
+    try:
+        client = FileDocument._get_connection()
+        bulk_actions = list(actions.values())
+        for index in get_rebuild_indices(client, FileDocument._index._name):
+            bulk_actions += [dict(action, _index=index) for action in actions.values()]
+        _, errors = bulk(
+            client,
+            bulk_actions,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+        for error in errors:
+            op_type, result = next(iter(error.items()))
+            # Deleting a document that is already gone is a success
+            if op_type == 'delete' and result.get('status') == 404:
+                continue
+            failed[str(result.get('_id'))] = str(result.get('error') or result.get('status'))
+    except Exception as e:
+        logger.error(f"Search index bulk request failed: {str(e)}")
+        failed = {str(file_id): str(e) for file_id in actions}
+
+    done = [task.id for task in tasks if str(task.file_id) not in failed or latest[task.file_id] is not task]
+    IndexOutbox.objects.filter(id__in=done).delete()
+    if len(failed) < len(actions):
+        # The index changed, so cached results may be stale
+        invalidate_search_cache()
+
+    for task in latest.values():
+        error = failed.get(str(task.file_id))
+        if error is not None:
+            IndexOutbox.objects.filter(id=task.id).update(
+                attempts=task.attempts + 1,
+                available_at=timezone.now() + get_retry_delay(task.attempts + 1),
+                last_error=error[:1000],
+            )
+
+    if failed:
+        logger.warning(f"Search indexing failed for {len(failed)} of {len(actions)} files; will retry")
+    return len(tasks)
+
+def get_outbox_stats():
+    """Queue depth and lag of the index outbox"""
+    stats = IndexOutbox.objects.aggregate(
+        pending=Count('id'),
+        retrying=Count('id', filter=Q(attempts__gt=0)),
+        oldest=Min('created_at'),
+    )
+    oldest = stats.pop('oldest')
+    stats['lag_seconds'] = round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0
+    return stats
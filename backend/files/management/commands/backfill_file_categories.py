@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from files.file_types import category_expression
+from files.models import File
+
+class Command(BaseCommand):
+    help = 'Recompute File.category from file_type, e.g. after adding a type to KNOWN_FILE_TYPES'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of files checked per UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        pending = File.objects.order_by('pk')
+        updated = checked = 0
+        last_pk = None
+        while True:
+            batch = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            checked += len(pks)
+
+            # Only rows whose stored category is out of date are written
+            category = category_expression()
+            updated += File.objects.filter(pk__in=pks).exclude(category=category).update(category=category)
+            self.stdout.write(f'  {checked} checked, {updated} updated')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfill finished: {updated} of {checked} files re-categorized'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from files.uploads import purge_expired_sessions, purge_stale_staging_files
+
+class Command(BaseCommand):
+    help = 'Remove expired resumable upload sessions, their stored parts and stale staged uploads'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Removing expired upload sessions...')
+        count = purge_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} expired upload sessions'))
+        count = purge_stale_staging_files()
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} stale staged uploads'))
@@ -0,0 +1,66 @@
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from files.indexing import get_outbox_stats, process_batch
+
+logger = logging.getLogger('files')
+
+class Command(BaseCommand):
+    help = 'Drain the search index outbox into Elasticsearch with bulk requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Tasks per _bulk request (defaults to SEARCH_INDEX_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Seconds to sleep when the outbox is empty (defaults to SEARCH_INDEX_POLL_INTERVAL)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain what is currently due and exit'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.SEARCH_INDEX_BATCH_SIZE
+        interval = options['interval'] or settings.SEARCH_INDEX_POLL_INTERVAL
+        self.stdout.write(f'Processing index outbox (batch size {batch_size})...')
+
+        processed = 0
+        failures = 0
+        while True:
+            # Replace connections the database dropped or that hit an error
+            close_old_connections()
+            try:
+                count = process_batch(batch_size)
+                stats = get_outbox_stats() if count else None
+            except Exception as e:
+                # A locked database or dropped connection must not end the worker
+                if options['once']:
+                    raise
+                failures += 1
+                delay = min(interval * 2 ** failures, settings.SEARCH_INDEX_MAX_BACKOFF)
+                logger.error(f"Index outbox batch failed ({failures} in a row), retrying in {delay:.0f}s: {str(e)}")
+                time.sleep(delay)
+                continue
+            failures = 0
+
+            processed += count
+            if count:
+                self.stdout.write(
+                    f"  {processed} processed, {stats['pending']} pending, lag {stats['lag_seconds']}s"
+                )
+                continue
+            if options['once']:
+                break
+            time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(f'Index outbox drained: {processed} tasks processed'))
@@ -1,8 +1,24 @@
-from django.core.management.base import BaseCommand
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_elasticsearch_dsl.registries import registry
+from elasticsearch.helpers import bulk, scan
+from files.indexing import get_rebuild_alias
+from files.search_cache import invalidate_search_cache
+
+# Ids checked against the database per query when pruning a new index
+PRUNE_CHUNK_SIZE = 1000
 
 class Command(BaseCommand):
-    help = 'Rebuild Elasticsearch index for all documents or specified apps'
+    help = (
+        'Rebuild Elasticsearch indices without downtime: load a new versioned index '
+        'with parallel bulk workers, then atomically point the alias at it'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -11,25 +27,234 @@ class Command(BaseCommand):
             type=str,
             help='Specify the model names to update (e.g. files.File)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of parallel bulk workers'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows per primary-key range handed to a worker'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Incremental catch-up: re-index rows uploaded since this ISO timestamp into the live index'
+        )
+        parser.add_argument(
+            '--if-stale',
+            action='store_true',
+            help='Only rebuild when the mapping changed or the document count disagrees with the database'
+        )
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Keep the previous index versions instead of deleting them after the swap'
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write('Rebuilding Elasticsearch index...')
-        models = options.get('models')
-        
-        if models:
-            # Rebuild specific models
-            for model_name in models:
-                app_label, model_name = model_name.split('.')
-                for doc in registry.get_documents():
-                    if doc._django.model._meta.app_label == app_label and doc._django.model._meta.model_name == model_name.lower():
-                        self.stdout.write(f'Rebuilding index for {model_name}')
-                        doc().update()
-                        break
-        else:
-            # Rebuild all documents
-            for doc in registry.get_documents():
-                model = doc._django.model
-                self.stdout.write(f'Rebuilding index for {model._meta.app_label}.{model._meta.model_name}')
-                doc().update()
-        
-        self.stdout.write(self.style.SUCCESS('Index rebuilding completed successfully!')) 
\ No newline at end of file
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be at least 1')
+
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since timestamp: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        for doc in self.get_documents(options.get('models')):
+            model = doc.django.model
+            label = f'{model._meta.app_label}.{model._meta.model_name}'
+            if since:
+                self.stdout.write(f'Catching up index for {label} since {since.isoformat()}')
+                self.catch_up(doc, since, options)
+            elif options['if_stale'] and (reason := self.get_stale_reason(doc)) is None:
+                self.stdout.write(f'Index for {label} is up to date, skipping')
+            else:
+                if options['if_stale']:
+                    self.stdout.write(f'Index for {label} is stale: {reason}')
+                self.stdout.write(f'Rebuilding index for {label}')
+                self.rebuild(doc, options)
+
+        invalidate_search_cache()
+        self.stdout.write(self.style.SUCCESS('Index rebuilding completed successfully!'))
+
+    def get_documents(self, models):
+        documents = list(registry.get_documents())
+        if not models:
+            return documents
+
+        selected = []
+        for model_name in models:
+            app_label, model_name = model_name.split('.')
+            for doc in documents:
+                if doc.django.model._meta.app_label == app_label and doc.django.model._meta.model_name == model_name.lower():
+                    selected.append(doc)
+                    break
+        return selected
+
+    def rebuild(self, doc, options):
+        client = doc._get_connection()
+        alias = doc._index._name
+        rebuild_alias = get_rebuild_alias(alias)
+        new_index = f"{alias}-{timezone.now().strftime('%Y%m%d%H%M%S')}"
+
+        # Create the new version with refresh disabled and no replicas while
+        # loading. The rebuild alias makes the outbox worker apply changes
+        # to it from now on, so the load below only creates missing
+        # documents and never overwrites a newer write from the worker.
+        body = doc._index.to_dict()
+        mappings = dict(body.get('mappings', {}))
+        mappings['_meta'] = {'checksum': self.get_mapping_checksum(doc)}
+        index_settings = dict(body.get('settings', {}))
+        final_settings = {
+            'refresh_interval': index_settings.get('refresh_interval'),
+            'number_of_replicas': index_settings.get('number_of_replicas', 1),
+        }
+        index_settings.update(refresh_interval='-1', number_of_replicas=0)
+        client.indices.create(index=new_index, settings=index_settings, mappings=mappings,
+                              aliases={rebuild_alias: {}})
+        self.stdout.write(f'  Created {new_index}')
+
+        try:
+            self.load(doc, doc().get_queryset(), new_index, options, op_type='create')
+            client.indices.put_settings(index=new_index, settings={'index': final_settings})
+            client.indices.refresh(index=new_index)
+            self.prune(doc, new_index)
+        except BaseException:
+            client.indices.delete(index=new_index)
+            raise
+
+        # Swap the alias in one request; a legacy concrete index with the
+        # alias's name is removed in the same atomic step
+        actions = [
+            {'remove': {'index': new_index, 'alias': rebuild_alias}},
+            {'add': {'index': new_index, 'alias': alias}},
+        ]
+        old_indices = []
+        if client.indices.exists_alias(name=alias):
+            old_indices = list(client.indices.get_alias(name=alias).keys())
+            actions = [{'remove': {'index': index, 'alias': alias}} for index in old_indices] + actions
+        elif client.indices.exists(index=alias):
+            actions.insert(0, {'remove_index': {'index': alias}})
+        client.indices.update_aliases(actions=actions)
+        self.stdout.write(f'  Alias {alias} now points to {new_index}')
+
+        if old_indices and not options['keep_old']:
+            client.indices.delete(index=','.join(old_indices))
+            self.stdout.write(f"  Deleted previous versions: {', '.join(old_indices)}")
+
+    def get_mapping_checksum(self, doc):
+        """Checksum of the document's settings and mapping, stored in the index's _meta"""
+        body = json.dumps(doc._index.to_dict(), sort_keys=True, default=str)
+        return hashlib.sha256(body.encode()).hexdigest()[:16]
+
+    def get_stale_reason(self, doc):
+        """Why the live index needs a rebuild, or None if it matches the database"""
+        client = doc._get_connection()
+        alias = doc._index._name
+        if not client.indices.exists(index=alias):
+            return 'index does not exist'
+
+        checksum = self.get_mapping_checksum(doc)
+        for index in client.indices.get_mapping(index=alias).values():
+            if index['mappings'].get('_meta', {}).get('checksum') != checksum:
+                return 'mapping changed'
+
+        indexed = client.count(index=alias)['count']
+        expected = doc().get_queryset().count()
+        if indexed != expected:
+            return f'{indexed} documents indexed, {expected} in the database'
+        return None
+
+    def prune(self, doc, index_name):
+        """
+        Delete documents whose rows no longer exist. A row the load read just
+        before it was deleted can be created after the worker's delete ran.
+        """
+        client = doc._get_connection()
+        model = doc.django.model
+        hits = scan(client, index=index_name, query={'query': {'match_all': {}}, '_source': False})
+        missing = []
+        chunk = []
+        for hit in hits:
+            chunk.append(hit['_id'])
+            if len(chunk) >= PRUNE_CHUNK_SIZE:
+                missing += self.get_missing_ids(model, chunk)
+                chunk = []
+        if chunk:
+            missing += self.get_missing_ids(model, chunk)
+
+        if missing:
+            bulk(client, ({'_op_type': 'delete', '_index': index_name, '_id': doc_id} for doc_id in missing),
+                 raise_on_error=False, refresh=True)
+            self.stdout.write(f'  Pruned {len(missing)} docs for deleted rows')
+
+    def get_missing_ids(self, model, ids):
+        existing = {str(pk) for pk in model.objects.filter(pk__in=ids).values_list('pk', flat=True)}
+        return [doc_id for doc_id in ids if doc_id not in existing]
+
+    def catch_up(self, doc, since, options):
+        queryset = doc().get_queryset().filter(uploaded_at__gte=since)
+        self.load(doc, queryset, doc._index._name, options)
+
+    def load(self, doc, queryset, index_name, options, op_type='index'):
+        """
+        Index `queryset` into `index_name` with parallel workers over
+        primary-key ranges. With op_type 'create', documents that already
+        exist are left as they are.
+        """
+        ranges = self.get_pk_ranges(queryset, options['chunk_size'])
+        if not ranges:
+            self.stdout.write('  Nothing to index')
+            return
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = executor.map(
+                lambda pk_range: self.index_range(doc, queryset, index_name, op_type, *pk_range),
+                ranges
+            )
+            indexed = 0
+            for count in results:
+                indexed += count
+                self.stdout.write(f'  {indexed} docs indexed')
+
+        elapsed = max(time.monotonic() - start, 0.001)
+        self.stdout.write(f'  Indexed {indexed} docs in {elapsed:.1f}s ({indexed / elapsed:.0f} docs/sec)')
+
+    def get_pk_ranges(self, queryset, chunk_size):
+        """Split the queryset into inclusive (first_pk, last_pk) ranges of `chunk_size` rows"""
+        ranges = []
+        first = previous = None
+        for position, pk in enumerate(queryset.order_by('pk').values_list('pk', flat=True).iterator()):
+            if position % chunk_size == 0:
+                if first is not None:
+                    ranges.append((first, previous))
+                first = pk
+            previous = pk
+        if first is not None:
+            ranges.append((first, previous))
+        return ranges
+
+    def index_range(self, doc, queryset, index_name, op_type, first_pk, last_pk):
+        try:
+            document = doc()
+            actions = (
+                dict(document._prepare_action(instance, 'index'), _index=index_name, _op_type=op_type)
+                for instance in queryset.filter(pk__gte=first_pk, pk__lte=last_pk).order_by('pk')
+            )
+            indexed, errors = bulk(doc._get_connection(), actions, refresh=False, raise_on_error=False)
+            # A create conflict means the worker already wrote a newer version
+            failed = [error for error in errors if next(iter(error.values())).get('status') != 409]
+            if failed:
+                raise CommandError(f'{len(failed)} docs failed to index into {index_name}: {failed[0]}')
+            return indexed + len(errors)
+        finally:
+            # Each worker thread has its own database connection
+            connection.close()
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from files.models import StorageStats
+
+class Command(BaseCommand):
+    help = 'Recompute the storage counters from the database and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift, do not update the counters'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling storage statistics...')
+        with transaction.atomic():
+            current = StorageStats.objects.select_for_update().filter(id=StorageStats.SINGLETON_ID).first()
+            expected = StorageStats.compute()
+
+            drift = {
+                field: value - (getattr(current, field) if current else 0)
+                for field, value in expected.items()
+                if current is None or getattr(current, field) != value
+            }
+            for field, delta in drift.items():
+                self.stdout.write(f'  {field}: off by {delta:+d} (should be {expected[field]})')
+
+            if not drift:
+                self.stdout.write(self.style.SUCCESS('Storage statistics are accurate'))
+                return
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING('Drift found; run without --dry-run to fix it'))
+                return
+            StorageStats.reconcile()
+
+        self.stdout.write(self.style.SUCCESS('Storage statistics reconciled'))
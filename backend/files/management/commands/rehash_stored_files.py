@@ -0,0 +1,117 @@
+import os
+from functools import partial
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from files.hashing import HASH_ALGORITHMS, calculate_path_hash, get_hash_algorithm
+from files.indexing import enqueue
+from files.models import File, StoredFile, delete_unreferenced_blob
+from files.storage import content_lock, content_path, content_storage
+
+class Command(BaseCommand):
+    help = 'Re-hash stored files with the configured algorithm, in resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm',
+            choices=sorted(HASH_ALGORITHMS),
+            help='Target hash algorithm (defaults to FILE_HASH_ALGORITHM)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of stored files to re-hash per batch'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Stop after this many stored files (run again to continue)'
+        )
+
+    def handle(self, *args, **options):
+        algorithm = options['algorithm'] or get_hash_algorithm()
+        batch_size = options['batch_size']
+        limit = options['limit']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        pending = StoredFile.objects.exclude(hash_algorithm=algorithm).order_by('pk')
+        self.stdout.write(f'Re-hashing {pending.count()} stored files with {algorithm}...')
+
+        rehashed = merged = skipped = 0
+        last_pk = None
+        while limit is None or rehashed + merged + skipped < limit:
+            batch = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            size = batch_size if limit is None else min(batch_size, limit - rehashed - merged - skipped)
+            batch = list(batch[:size])
+            if not batch:
+                break
+
+            for stored_file in batch:
+                last_pk = stored_file.pk
+                try:
+                    file_hash = calculate_path_hash(stored_file.file.path, algorithm)
+                except OSError as e:
+                    self.stderr.write(f'Skipping {stored_file.id}: {e}')
+                    skipped += 1
+                    continue
+
+                if self.rehash(stored_file, algorithm, file_hash):
+                    rehashed += 1
+                else:
+                    merged += 1
+
+            self.stdout.write(f'  {rehashed} re-hashed, {merged} merged, {skipped} skipped')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Re-hashing finished: {rehashed} re-hashed, {merged} merged into existing content, {skipped} skipped'
+        ))
+
+    def rehash(self, stored_file, algorithm, file_hash):
+        """
+        Store the new digest on `stored_file` and move its blob to the
+        matching content path. If the content is already stored under that
+        digest, move its references there and drop the duplicate blob
+        instead. Returns False when a merge happened.
+
+        Uploads of the same content hold the lock on the new path while they
+        store it, so neither can add a second row or blob for it meanwhile.
+        """
+        old_name = stored_file.file.name
+        new_name = content_path(file_hash)
+        source = content_storage.path(old_name)
+        target = content_storage.path(new_name)
+        blob_moved = False
+
+        with content_lock(old_name, new_name):
+            try:
+                with transaction.atomic():
+                    existing = StoredFile.objects.select_for_update().filter(
+                        hash_algorithm=algorithm, file_hash=file_hash
+                    ).first()
+                    # The indexed file_hash of every referencing file changes
+                    enqueue(File.objects.filter(stored_file=stored_file).values_list('id', flat=True))
+                    if existing is None:
+                        StoredFile.objects.filter(pk=stored_file.pk).update(
+                            hash_algorithm=algorithm, file_hash=file_hash, file=new_name
+                        )
+                        if new_name != old_name:
+                            os.makedirs(os.path.dirname(target), exist_ok=True)
+                            # Same filesystem, so this is a rename rather than a copy
+                            os.replace(source, target)
+                            blob_moved = True
+                        return True
+
+                    moved = File.objects.filter(stored_file=stored_file).update(stored_file=existing)
+                    StoredFile.objects.filter(pk=existing.pk).update(reference_count=F('reference_count') + moved)
+                    stored_file.delete()
+            except BaseException:
+                # The row still points at the old path
+                if blob_moved:
+                    os.replace(target, source)
+                raise
+
+        # Outside the lock, since delete_unreferenced_blob takes it itself
+        transaction.on_commit(partial(delete_unreferenced_blob, old_name))
+        return False
@@ -0,0 +1,69 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from files.models import StoredFile
+from files.storage import UPLOADS_DIR, content_path, content_storage
+
+class Command(BaseCommand):
+    help = 'Move stored files to their content-addressed paths (uploads/ab/cd/<hash>) in resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of stored files to relocate per batch'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        # Rows whose path does not match their hash yet; relocated rows drop
+        # out of this set, so an interrupted run simply continues
+        pending = StoredFile.objects.annotate(
+            expected_path=Concat(
+                Value(f'{UPLOADS_DIR}/'), Substr('file_hash', 1, 2), Value('/'),
+                Substr('file_hash', 3, 2), Value('/'), F('file_hash')
+            )
+        ).exclude(file=F('expected_path')).order_by('pk')
+        self.stdout.write(f'Relocating {pending.count()} stored files...')
+
+        moved = missing = 0
+        last_pk = None
+        while True:
+            batch = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+
+            for stored_file in batch:
+                last_pk = stored_file.pk
+                if self.relocate(stored_file):
+                    moved += 1
+                else:
+                    missing += 1
+
+            self.stdout.write(f'  {moved} relocated, {missing} missing on disk')
+
+        self.stdout.write(self.style.SUCCESS(f'Relocation finished: {moved} relocated, {missing} missing on disk'))
+
+    def relocate(self, stored_file):
+        """Move one blob and repoint its row; returns False if the blob is missing"""
+        old_name = stored_file.file.name
+        new_name = content_path(stored_file.file_hash)
+        source = content_storage.path(old_name)
+        target = content_storage.path(new_name)
+
+        if os.path.exists(source):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Same filesystem, so this is a rename rather than a copy
+            os.replace(source, target)
+        elif not os.path.exists(target):
+            self.stderr.write(f'Skipping {stored_file.id}: {old_name} does not exist')
+            return False
+
+        StoredFile.objects.filter(pk=stored_file.pk).update(file=new_name)
+        return True
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:45
+
+from django.db import migrations, models
+import files.hashing
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_alter_file_stored_file_alter_storedfile_file_and_more'),
+    ]
+
+    operations = [
+        # Rows that predate this column were all hashed with MD5
+        migrations.AddField(
+            model_name='storedfile',
+            name='hash_algorithm',
+            field=models.CharField(default='md5', max_length=16),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='storedfile',
+            name='hash_algorithm',
+            field=models.CharField(default=files.hashing.get_hash_algorithm, max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='storedfile',
+            name='file_hash',
+            field=models.CharField(db_index=True, max_length=128),
+        ),
+        migrations.AddConstraint(
+            model_name='storedfile',
+            constraint=models.UniqueConstraint(fields=('hash_algorithm', 'file_hash'), name='unique_content_hash'),
+        ),
+    ]
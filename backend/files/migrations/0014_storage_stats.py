@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:49
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Count, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_sizes_and_stats(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    StoredFile = apps.get_model('files', 'StoredFile')
+    StorageStats = apps.get_model('files', 'StorageStats')
+
+    # Every reference to a stored file has the same size; take any of them
+    StoredFile.objects.update(size=Coalesce(
+        Subquery(File.objects.filter(stored_file=OuterRef('pk')).values('size')[:1]), 0
+    ))
+
+    files = File.objects.aggregate(count=Count('id'), size=Sum('size'))
+    stored = StoredFile.objects.aggregate(count=Count('id'), size=Sum('size'))
+    StorageStats.objects.update_or_create(id=1, defaults={
+        'total_files': files['count'],
+        'unique_files': stored['count'],
+        'total_size': files['size'] or 0,
+        'actual_size': stored['size'] or 0,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0013_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_files', models.BigIntegerField(default=0)),
+                ('unique_files', models.BigIntegerField(default=0)),
+                ('total_size', models.BigIntegerField(default=0)),
+                ('actual_size', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'storage stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_sizes_and_stats, migrations.RunPython.noop),
+    ]
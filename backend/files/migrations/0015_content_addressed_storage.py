@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:51
+
+from django.db import migrations, models
+import files.models
+import files.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0014_storage_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storedfile',
+            name='file',
+            field=models.FileField(storage=files.storage.ContentAddressedStorage(), upload_to=files.models.file_upload_path),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0016_index_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['uploaded_at', 'id'], name='files_metad_uploade_9c35e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['file_type', 'uploaded_at', 'id'], name='files_metad_file_ty_2979aa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['size'], name='files_metad_size_f2a6a1_idx'),
+        ),
+    ]
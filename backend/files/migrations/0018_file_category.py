@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:59
+
+from django.db import migrations, models
+from files.file_types import category_expression
+
+
+def populate_categories(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    File.objects.update(category=category_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0017_file_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_metad_file_ty_2979aa_idx',
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='category',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_categories, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['category', 'uploaded_at', 'id'], name='files_metad_categor_cbd318_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0018_file_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='completing',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0019_upload_session_completing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchCacheState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+                ('hits', models.BigIntegerField(default=0)),
+                ('misses', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'search cache state',
+            },
+        ),
+    ]
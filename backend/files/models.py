@@ -1,119 +1,112 @@
 from django.db import models
 import uuid
-import os
-import shutil
 from django.conf import settings
 import logging
 from django.db import transaction
-from django.db.models.signals import pre_delete, post_delete
+from django.db.models.signals import post_delete
 from django.dispatch import receiver
-from django.core.files import File
-import tempfile
+from datetime import timedelta
+from functools import partial
+from django.utils import timezone
+from .file_types import CATEGORY_OTHER, get_file_category
+from .hashing import get_hash_algorithm
+from .storage import content_lock, content_path, content_storage
 
 def file_upload_path(instance, filename):
-    """Generate file path for new file upload"""
-    ext = filename.split('.')[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
-    upload_path = os.path.join('uploads', filename)
-    
-    # Ensure uploads directory exists and has proper permissions
-    uploads_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
-    os.makedirs(uploads_dir, exist_ok=True)
-    os.chmod(uploads_dir, 0o777)
-    
-    return upload_path
+    """Generate the content-addressed path for a stored file (uploads/ab/cd/<hash>)"""
+    return content_path(instance.file_hash)
+
+def delete_unreferenced_blob(name):
+    """Delete a blob unless a StoredFile row (re)claimed the same content path"""
+    with content_lock(name):
+        if not StoredFile.objects.filter(file=name).exists():
+            content_storage.delete(name)
+
+def claim_stored_files(stored_files):
+    """
+    Add a reference to each StoredFile and return the ones that still
+    exist. Uploads claim the content they resolved before creating their
+    File, so deleting the content's last File meanwhile cannot remove the
+    row; a row deleted before the claim is not returned and the upload
+    stores the content again. Give the reference back with
+    release_stored_files once the File exists (or failed to).
+    """
+    ids = [stored_file.id for stored_file in stored_files]
+    if not ids:
+        return []
+    claimed = StoredFile.objects.filter(id__in=ids).update(reference_count=models.F('reference_count') + 1)
+    if claimed == len(ids):
+        return list(stored_files)
+    # Ids are never reused, so a row that is still there was claimed
+    existing = set(StoredFile.objects.filter(id__in=ids).values_list('id', flat=True))
+    return [stored_file for stored_file in stored_files if stored_file.id in existing]
 
-@receiver(pre_delete, sender='files.File')
-def handle_file_deletion(sender, instance, **kwargs):
-    """Handle file deletion by copying the file to a new location if needed"""
+def release_stored_files(stored_file_ids):
+    """
+    Drop one reference from each StoredFile, deleting rows that are left
+    without any. The blob is only removed once the deletion is committed.
+    """
     logger = logging.getLogger('files')
-    logger.info(f"PRE_DELETE signal triggered for file {instance.id} ({instance.original_filename})")
-    
-    # For files with stored_file, check if there are other references
-    if instance.stored_file:
-        # Get the count of other references before this deletion
-        other_references = File.objects.filter(stored_file=instance.stored_file).exclude(id=instance.id).count()
-        if other_references > 0 and instance.stored_file.file:
-            try:
-                # Check if the file exists before trying to copy it
-                if not os.path.exists(instance.stored_file.file.path):
-                    logger.warning(f"File {instance.stored_file.file.path} does not exist, skipping copy")
-                    return
-                
-                logger.info(f"File {instance.id} has {other_references} other references, preserving file before deletion")
-                logger.info(f"Original file path: {instance.stored_file.file.path}")
-                
-                # Use a transaction to ensure atomicity
-                with transaction.atomic():
-                    # First, update the database to remove the file path
-                    logger.info(f"Updating database to remove file path for {instance.id}")
-                    File.objects.filter(id=instance.id).update(stored_file=None)
-                    logger.info(f"Database updated, file path removed")
-                    
-                    # Now we can safely copy the file
-                    # Generate a new filename
-                    ext = instance.original_filename.split('.')[-1]
-                    new_filename = f"{uuid.uuid4()}.{ext}"
-                    new_path = os.path.join('uploads', new_filename)
-                    
-                    # Ensure uploads directory exists
-                    uploads_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
-                    os.makedirs(uploads_dir, exist_ok=True)
-                    os.chmod(uploads_dir, 0o777)
-                    
-                    # Copy the file to the new location
-                    new_full_path = os.path.join(settings.MEDIA_ROOT, new_path)
-                    shutil.copy2(instance.stored_file.file.path, new_full_path)
-                    logger.info(f"Copied file to new location: {new_path}")
-                    
-                    # Find the first other reference and update it with the new file path
-                    first_other = File.objects.filter(stored_file=instance.stored_file).exclude(id=instance.id).order_by('uploaded_at').first()
-                    if first_other:
-                        logger.info(f"Updating first other reference {first_other.id} with new file path")
-                        first_other.stored_file.file = new_path
-                        first_other.stored_file.save()
-                        logger.info(f"First other reference updated with new file path: {new_path}")
-            except Exception as e:
-                logger.error(f"Error handling file deletion: {str(e)}")
-                logger.exception("Full traceback:")
-                # Don't raise the exception, let the deletion continue
-    else:
-        logger.info(f"File {instance.id} has no stored file, allowing normal deletion")
+    with transaction.atomic():
+        StoredFile.objects.filter(id__in=stored_file_ids).update(reference_count=models.F('reference_count') - 1)
+        # The UPDATE holds these rows until commit, so no upload can claim
+        # one between the check and the delete
+        for stored_file in StoredFile.objects.filter(id__in=stored_file_ids, reference_count__lte=0):
+            logger.info(f"No more references to stored file {stored_file.id}, deleting")
+            stored_file.delete()
+            if stored_file.file:
+                transaction.on_commit(partial(delete_unreferenced_blob, stored_file.file.name))
 
 @receiver(post_delete, sender='files.File')
 def cleanup_stored_file(sender, instance, **kwargs):
-    """Clean up stored file after File deletion"""
+    """
+    Release the deleted File's reference. Deleting a file is metadata-only:
+    shared content stays where it is, and the blob is removed only when
+    the last reference goes.
+    """
     logger = logging.getLogger('files')
     logger.info(f"POST_DELETE signal triggered for file {instance.id} ({instance.original_filename})")
     
-    if instance.stored_file:
-        # Get the current reference count from the database
-        stored_file = StoredFile.objects.get(id=instance.stored_file.id)
-        # Decrement reference count
-        stored_file.reference_count -= 1
-        stored_file.save()
-        
-        # If no more references, delete the stored file
-        if stored_file.reference_count <= 0:
-            logger.info(f"No more references to stored file {stored_file.id}, deleting")
-            if stored_file.file:
-                stored_file.file.delete(save=False)
-            stored_file.delete()
+    StorageStats.adjust(total_files=-1, total_size=-instance.size)
+    
+    if instance.stored_file_id:
+        release_stored_files([instance.stored_file_id])
+
+@receiver(post_delete, sender='files.StoredFile')
+def release_stored_file_stats(sender, instance, **kwargs):
+    """Remove deleted content from the storage counters"""
+    StorageStats.adjust(unique_files=-1, actual_size=-instance.size)
 
 class StoredFile(models.Model):
     """Model to store physical files and manage reference counts"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    file = models.FileField(upload_to=file_upload_path)
-    file_hash = models.CharField(max_length=32, unique=True)
+    file = models.FileField(upload_to=file_upload_path, storage=content_storage)
+    file_hash = models.CharField(max_length=128, db_index=True)
+    hash_algorithm = models.CharField(max_length=16, default=get_hash_algorithm)
+    size = models.BigIntegerField(default=0)
     reference_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hash_algorithm', 'file_hash'], name='unique_content_hash'),
+        ]
+
     def increment_reference_count(self):
-        """Increment the reference count and save"""
-        # Get the current reference count from the database
-        self.refresh_from_db()
-        self.reference_count += 1
-        self.save()
+        """Atomically increment the reference count in a single UPDATE"""
+        return StoredFile.objects.filter(id=self.id).update(reference_count=models.F('reference_count') + 1)
+
+    def decrement_reference_count(self):
+        """Atomically decrement the reference count in a single UPDATE"""
+        return StoredFile.objects.filter(id=self.id).update(reference_count=models.F('reference_count') - 1)
+
+    def save(self, *args, **kwargs):
+        """Override save to keep the storage counters current"""
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                StorageStats.adjust(unique_files=1, actual_size=self.size)
 
     def __str__(self):
         return f"{self.file_hash} ({self.reference_count} references)"
@@ -124,12 +117,21 @@ class File(models.Model):
     stored_file = models.ForeignKey(StoredFile, on_delete=models.CASCADE, related_name='file_records', null=True)
     original_filename = models.CharField(max_length=255)
     file_type = models.CharField(max_length=100)
+    # Derived from file_type on save (see file_types.py), for indexed type filters
+    category = models.PositiveSmallIntegerField(default=CATEGORY_OTHER)
     size = models.BigIntegerField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'files_metadata'  # Custom table name
         ordering = ['-uploaded_at']
+        # Match the list filters; uploaded_at/id is also the cursor order.
+        # stored_file is indexed by its ForeignKey.
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id']),
+            models.Index(fields=['category', 'uploaded_at', 'id']),
+            models.Index(fields=['size']),
+        ]
     
     def __str__(self):
         return self.original_filename
@@ -137,8 +139,133 @@ class File(models.Model):
     def save(self, *args, **kwargs):
         """Override save to handle reference counting"""
         is_new = self._state.adding
-        super().save(*args, **kwargs)
-        
-        # If this is a new file and has a stored_file, increment the reference count
-        if is_new and self.stored_file:
-            self.stored_file.increment_reference_count()
+        self.category = get_file_category(self.file_type)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # If this is a new file and has a stored_file, increment the reference count
+            if is_new and self.stored_file_id:
+                self.stored_file.increment_reference_count()
+            if is_new:
+                StorageStats.adjust(total_files=1, total_size=self.size)
+
+def upload_session_expiry():
+    """Default expiry for a new upload session"""
+    return timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+class UploadSession(models.Model):
+    """Resumable upload whose parts are kept under MEDIA_ROOT until it is completed"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    original_filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    part_size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=upload_session_expiry, db_index=True)
+    # Claimed by the complete request that is assembling the parts
+    completing = models.BooleanField(default=False)
+
+    @property
+    def part_count(self):
+        """Number of parts the upload is split into"""
+        return max(1, -(-self.size // self.part_size))
+
+    def expected_part_size(self, part_number):
+        """Size in bytes of the given (zero-based) part"""
+        if part_number < self.part_count - 1:
+            return self.part_size
+        return self.size - self.part_size * (self.part_count - 1)
+
+    def __str__(self):
+        return f"{self.original_filename} ({self.size} bytes, expires {self.expires_at})"
+
+class StorageStats(models.Model):
+    """
+    Single row of running storage counters, adjusted in the same
+    transaction as the uploads and deletions that change them.
+    """
+    total_files = models.BigIntegerField(default=0)
+    unique_files = models.BigIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)
+    actual_size = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    SINGLETON_ID = 1
+
+    class Meta:
+        verbose_name_plural = 'storage stats'
+
+    @classmethod
+    def compute(cls):
+        """Compute the counters from scratch with one aggregate per table"""
+        files = File.objects.aggregate(count=models.Count('id'), size=models.Sum('size'))
+        stored = StoredFile.objects.aggregate(count=models.Count('id'), size=models.Sum('size'))
+        return {
+            'total_files': files['count'],
+            'unique_files': stored['count'],
+            'total_size': files['size'] or 0,
+            'actual_size': stored['size'] or 0,
+        }
+
+    @classmethod
+    def reconcile(cls):
+        """Overwrite the counters with freshly computed values"""
+        stats, _ = cls.objects.update_or_create(id=cls.SINGLETON_ID, defaults=cls.compute())
+        return stats
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """Apply counter deltas in a single UPDATE"""
+        updated = cls.objects.filter(id=cls.SINGLETON_ID).update(
+            updated_at=timezone.now(),
+            **{field: models.F(field) + delta for field, delta in deltas.items()}
+        )
+        if not updated:
+            # First use (or the row was removed): rebuild it, which already includes this change
+            cls.reconcile()
+
+    def __str__(self):
+        return f"{self.total_files} files, {self.unique_files} stored ({self.actual_size} bytes)"
+
+class SearchCacheState(models.Model):
+    """
+    Single row holding the search result cache version and hit/miss
+    counters. It is only changed with F() updates, so every worker process
+    sees the same version and no increment is lost.
+    """
+    version = models.BigIntegerField()
+    hits = models.BigIntegerField(default=0)
+    misses = models.BigIntegerField(default=0)
+
+    SINGLETON_ID = 1
+
+    class Meta:
+        verbose_name_plural = 'search cache state'
+
+    def __str__(self):
+        return f"version {self.version} ({self.hits} hits, {self.misses} misses)"
+
+class IndexOutbox(models.Model):
+    """
+    Pending search index mutation. Rows are written in the same transaction
+    as the File change and drained in bulk by process_index_outbox.
+    """
+    ACTION_INDEX = 'index'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = [
+        (ACTION_INDEX, 'Index'),
+        (ACTION_DELETE, 'Delete'),
+    ]
+
+    file_id = models.UUIDField(db_index=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = 'index outbox'
+
+    def __str__(self):
+        return f"{self.action} {self.file_id} (attempts: {self.attempts})"
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db.models import F
+from .models import SearchCacheState
+
+logger = logging.getLogger('files')
+
+# Hit/miss counts from this process not yet added to SearchCacheState
+_pending_lookups = {'hits': 0, 'misses': 0}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+def initial_version():
+    # Start a new version at the current time rather than 1, so entries
+    # cached before the database was reset are never served again
+    return int(time.time() * 1000)
+
+def get_state_queryset():
+    """The SearchCacheState row, created on first use"""
+    SearchCacheState.objects.get_or_create(
+        id=SearchCacheState.SINGLETON_ID, defaults={'version': initial_version()}
+    )
+    return SearchCacheState.objects.filter(id=SearchCacheState.SINGLETON_ID)
+
+# Get current search cache version
+def get_search_cache_version():
+    version = SearchCacheState.objects.filter(
+        id=SearchCacheState.SINGLETON_ID
+    ).values_list('version', flat=True).first()
+    if version is None:
+        version = get_state_queryset().values_list('version', flat=True).get()
+    return version
+
+# Increment search cache version to invalidate all search caches
+def invalidate_search_cache():
+    updated = SearchCacheState.objects.filter(id=SearchCacheState.SINGLETON_ID).update(version=F('version') + 1)
+    if not updated:
+        get_state_queryset()
+    logger.info("Search cache invalidated")
+
+def record_search_cache_lookup(hit):
+    """Count a lookup in memory; the shared counters are updated every few seconds"""
+    global _last_flush
+    with _pending_lock:
+        _pending_lookups['hits' if hit else 'misses'] += 1
+        due = time.monotonic() - _last_flush >= settings.SEARCH_CACHE_STATS_FLUSH_INTERVAL
+    if due:
+        flush_search_cache_stats()
+
+def flush_search_cache_stats():
+    """Add this process's pending hit/miss counts to the shared counters in one UPDATE"""
+    global _last_flush
+    with _pending_lock:
+        hits, misses = _pending_lookups['hits'], _pending_lookups['misses']
+        _pending_lookups.update(hits=0, misses=0)
+        _last_flush = time.monotonic()
+    if hits or misses:
+        get_state_queryset().update(hits=F('hits') + hits, misses=F('misses') + misses)
+
+def get_search_cache_stats():
+    """
+    Hit/miss counters for search results. Other worker processes may hold
+    up to SEARCH_CACHE_STATS_FLUSH_INTERVAL seconds of lookups not yet added.
+    """
+    flush_search_cache_stats()
+    state = get_state_queryset().get()
+    lookups = state.hits + state.misses
+    return {
+        'hits': state.hits,
+        'misses': state.misses,
+        'hit_ratio': round(state.hits / lookups, 4) if lookups else None,
+        'version': state.version,
+    }
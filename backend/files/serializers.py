@@ -1,6 +1,17 @@
 from rest_framework import serializers
-from .models import File, StoredFile
+from .models import File, StoredFile, UploadSession
+from .uploads import get_received_parts
 from django.conf import settings
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from urllib.parse import urljoin
+
+# Bounds for the part size a client may request for an upload session
+MIN_PART_SIZE = 1024 * 1024
+MAX_PART_SIZE = 256 * 1024 * 1024
+
+# Shared field instance so datetimes render exactly as ModelSerializer would
+datetime_field = serializers.DateTimeField()
 
 class StoredFileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,7 +32,7 @@ class FileSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request is None:
             return None
-        return request.build_absolute_uri(obj.stored_file.file.url)
+        return request.build_absolute_uri(reverse('file-download', args=[obj.id]))
 
     def to_representation(self, instance):
         """Convert the instance to a representation that includes the stored_file details"""
@@ -32,4 +43,107 @@ class FileSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Create a new file record with a stored file"""
         # The view will handle creating the StoredFile and passing it in validated_data
-        return super().create(validated_data) 
\ No newline at end of file
+        return super().create(validated_data)
+
+class FileListSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer for list and search responses.
+
+    Produces the same shape as FileSerializer but builds plain dicts, so no
+    fields or nested serializers are instantiated per row. Expects the
+    queryset to select_related('stored_file').
+    """
+
+    def get_base_url(self):
+        if not hasattr(self, '_base_url'):
+            request = self.context.get('request')
+            self._base_url = request.build_absolute_uri('/') if request is not None else None
+        return self._base_url
+
+    def to_representation(self, instance):
+        stored_file = instance.stored_file
+        base_url = self.get_base_url()
+        return {
+            'id': str(instance.id),
+            'stored_file': {
+                'id': str(stored_file.id),
+                'file_hash': stored_file.file_hash,
+                'reference_count': stored_file.reference_count,
+                'created_at': datetime_field.to_representation(stored_file.created_at),
+            },
+            'original_filename': instance.original_filename,
+            'file_type': instance.file_type,
+            'size': instance.size,
+            'uploaded_at': datetime_field.to_representation(instance.uploaded_at),
+            'file_url': urljoin(base_url, reverse('file-download', args=[instance.id])) if base_url is not None else None,
+        }
+
+class SearchHitSerializer(FileListSerializer):
+    """
+    Builds the FileListSerializer shape from an Elasticsearch hit's _source.
+    reference_count changes with every duplicate upload, so it is not
+    indexed; the view passes live counts in the 'reference_counts' context.
+    Hits indexed before the stored file fields were added are not complete
+    and must be served from the database instead.
+    """
+
+    @staticmethod
+    def is_complete(hit):
+        return getattr(hit, 'file_path', None) is not None
+
+    @staticmethod
+    def to_datetime(value):
+        # Hits from a versioned index behind the alias are not matched to
+        # FileDocument, so their dates arrive as ISO strings
+        return parse_datetime(value) if isinstance(value, str) else value
+
+    def to_representation(self, hit):
+        base_url = self.get_base_url()
+        return {
+            'id': hit.meta.id,
+            'stored_file': {
+                'id': hit.stored_file_id,
+                'file_hash': hit.file_hash,
+                'reference_count': self.context.get('reference_counts', {}).get(hit.meta.id),
+                'created_at': datetime_field.to_representation(self.to_datetime(hit.stored_file_created_at)),
+            },
+            'original_filename': hit.original_filename,
+            'file_type': hit.file_type,
+            'size': hit.size,
+            'uploaded_at': datetime_field.to_representation(self.to_datetime(hit.uploaded_at)),
+            'file_url': urljoin(base_url, reverse('file-download', args=[hit.meta.id])) if base_url is not None else None,
+        }
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    part_count = serializers.ReadOnlyField()
+    received_parts = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'original_filename', 'file_type', 'size', 'part_size', 'part_count',
+                  'received_parts', 'created_at', 'expires_at']
+        read_only_fields = ['id', 'created_at', 'expires_at']
+        extra_kwargs = {
+            'file_type': {'required': False},
+            'part_size': {'required': False},
+        }
+
+    def get_received_parts(self, obj):
+        return get_received_parts(obj)
+
+    def validate_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError('Size cannot be negative')
+        if value > settings.UPLOAD_SESSION_MAX_SIZE:
+            raise serializers.ValidationError(f'Size cannot exceed {settings.UPLOAD_SESSION_MAX_SIZE} bytes')
+        return value
+
+    def validate_part_size(self, value):
+        if not MIN_PART_SIZE <= value <= MAX_PART_SIZE:
+            raise serializers.ValidationError(f'Part size must be between {MIN_PART_SIZE} and {MAX_PART_SIZE} bytes')
+        return value
+
+    def create(self, validated_data):
+        validated_data.setdefault('part_size', settings.UPLOAD_SESSION_PART_SIZE)
+        validated_data.setdefault('file_type', 'application/octet-stream')
+        return super().create(validated_data)
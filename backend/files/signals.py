@@ -1,22 +1,18 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import File
-from .documents import FileDocument
-import logging
+from .models import File, IndexOutbox
+from .indexing import enqueue
+from .search_cache import invalidate_search_cache
 
 @receiver(post_save, sender=File)
 def update_document(sender, instance=None, created=False, **kwargs):
-    """Update the Elasticsearch document when a File is saved."""
-    FileDocument().update(instance)
+    """Queue an Elasticsearch update when a File is saved."""
+    enqueue([instance.id], IndexOutbox.ACTION_INDEX)
+    transaction.on_commit(invalidate_search_cache)
 
 @receiver(post_delete, sender=File)
 def delete_document(sender, instance=None, **kwargs):
-    """Delete the Elasticsearch document when a File is deleted."""
-    try:
-        doc = FileDocument()
-        doc.meta.id = instance.id
-        doc.delete()
-    except Exception as e:
-        # Log the error but don't prevent the deletion
-        logger = logging.getLogger('files')
-        logger.error(f"Error deleting Elasticsearch document: {str(e)}") 
\ No newline at end of file
+    """Queue an Elasticsearch delete when a File is deleted."""
+    enqueue([instance.id], IndexOutbox.ACTION_DELETE)
+    transaction.on_commit(invalidate_search_cache)
@@ -0,0 +1,78 @@
+import fcntl
+import os
+import tempfile
+import zlib
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Root directory (relative to MEDIA_ROOT) for stored blobs
+UPLOADS_DIR = 'uploads'
+
+# Lock files (relative to MEDIA_ROOT) for content_lock; content paths are
+# spread over a fixed number of them
+CONTENT_LOCKS_DIR = '.locks'
+CONTENT_LOCK_STRIPES = 256
+
+def content_path(file_hash):
+    """
+    Return the storage name for content with the given hash, fanned out
+    over two directory levels: uploads/ab/cd/abcd...
+    """
+    return os.path.join(UPLOADS_DIR, file_hash[:2], file_hash[2:4], file_hash)
+
+@contextmanager
+def content_lock(*names):
+    """
+    Hold an exclusive, cross-process lock on the given content paths.
+
+    New content is stored and its StoredFile row committed under this
+    lock, and an unreferenced blob is only deleted under it after checking
+    that no row claims the path. Without it the delete could remove a blob
+    an upload had just promoted but not yet committed a row for.
+    """
+    lock_dir = os.path.join(settings.MEDIA_ROOT, CONTENT_LOCKS_DIR)
+    os.makedirs(lock_dir, exist_ok=True)
+    # flock is per open file, so take each stripe once, in a fixed order
+    stripes = sorted({zlib.crc32(name.encode()) % CONTENT_LOCK_STRIPES for name in names})
+    with ExitStack() as stack:
+        for stripe in stripes:
+            lock_file = stack.enter_context(open(os.path.join(lock_dir, f'{stripe:02x}.lock'), 'a'))
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Filesystem storage for content-addressed blobs. A name identifies its
+    content, so a file that already exists under that name is kept as-is
+    rather than saved again under a suffixed name.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write beside the target and rename, so concurrent writers of the
+        # same content never expose a partial file
+        if hasattr(content, 'temporary_file_path'):
+            os.replace(content.temporary_file_path(), full_path)
+        else:
+            with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.replace(tmp.name, full_path)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+content_storage = ContentAddressedStorage()
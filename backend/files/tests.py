@@ -0,0 +1,712 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.http import HttpResponse, UnreadablePostError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, AsyncRequestFactory, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+from core.middleware import AsyncWhiteNoiseMiddleware
+from .async_views import download_file
+from .downloads import etag_matches, get_etag, parse_range
+from .file_types import get_file_category
+from .hashing import HASH_ALGORITHMS, IncrementalHasher, calculate_path_hash
+from .models import File, StorageStats, StoredFile, UploadSession
+from .search_cache import get_search_cache_version
+from .storage import content_path
+from .serializers import MIN_PART_SIZE
+from .uploads import get_session_dir, get_staging_dir, purge_stale_staging_files
+from .views import FileCursorPagination, FileViewSet
+
+class MediaRootMixin:
+    """Store uploads in a throwaway MEDIA_ROOT for each test"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+def create_files(count, file_type='text/plain'):
+    """File rows with one StoredFile each; the content itself is never read"""
+    for i in range(count):
+        stored_file = StoredFile.objects.create(file=f'uploads/{file_type}/{i}', file_hash=f'{file_type}-{i}', size=i)
+        File.objects.create(stored_file=stored_file, original_filename=f'file-{i}', file_type=file_type, size=i)
+
+class ConcurrentReferenceCountTests(MediaRootMixin, TransactionTestCase):
+    """Reference counts and storage counters stay exact under parallel uploads and deletes"""
+    WORKERS = 8
+    OPERATIONS = 40
+
+    def upload(self, name, content):
+        try:
+            return APIClient().post('/api/files/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        finally:
+            # Each worker thread has its own database connection
+            connection.close()
+
+    def delete(self, file_id):
+        try:
+            return APIClient().delete(f'/api/files/{file_id}/')
+        finally:
+            connection.close()
+
+    def run_parallel(self, func, args):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            return list(executor.map(func, *zip(*args)))
+
+    def assert_storage_stats_exact(self):
+        stats = StorageStats.objects.get(id=StorageStats.SINGLETON_ID)
+        expected = StorageStats.compute()
+        for field, value in expected.items():
+            self.assertEqual(getattr(stats, field), value, field)
+
+    def test_parallel_uploads_of_the_same_content(self):
+        content = b'identical bytes'
+        responses = self.run_parallel(self.upload, [(f'copy-{i}.txt', content) for i in range(self.OPERATIONS)])
+
+        self.assertEqual([response.status_code for response in responses], [201] * self.OPERATIONS)
+        self.assertEqual(sum(not response.data['is_reference'] for response in responses), 1)
+        stored_file = StoredFile.objects.get()
+        self.assertEqual(stored_file.reference_count, self.OPERATIONS)
+        self.assertEqual(File.objects.count(), self.OPERATIONS)
+        self.assert_storage_stats_exact()
+
+    def test_parallel_uploads_and_deletes(self):
+        content = b'shared bytes'
+        existing = [self.upload(f'old-{i}.txt', content).data['id'] for i in range(self.OPERATIONS)]
+
+        operations = [(self.delete, file_id) for file_id in existing]
+        operations += [(self.upload, f'new-{i}.txt', content) for i in range(self.OPERATIONS)]
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            futures = [executor.submit(operation, *args) for operation, *args in operations]
+            statuses = [future.result().status_code for future in futures]
+
+        self.assertEqual(statuses, [204] * self.OPERATIONS + [201] * self.OPERATIONS)
+        stored_file = StoredFile.objects.get()
+        self.assertEqual(stored_file.reference_count, self.OPERATIONS)
+        self.assertEqual(File.objects.filter(stored_file=stored_file).count(), self.OPERATIONS)
+        self.assertTrue(os.path.exists(stored_file.file.path))
+        self.assert_storage_stats_exact()
+
+    def test_parallel_deletes_release_the_content(self):
+        content = b'short-lived bytes'
+        file_ids = [self.upload(f'file-{i}.txt', content).data['id'] for i in range(self.OPERATIONS)]
+        path = StoredFile.objects.get().file.path
+
+        responses = self.run_parallel(self.delete, [(file_id,) for file_id in file_ids])
+
+        self.assertEqual([response.status_code for response in responses], [204] * self.OPERATIONS)
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assert_storage_stats_exact()
+
+    def test_uploads_racing_deletes_of_the_last_reference(self):
+        contents = [f'content {i}'.encode() for i in range(self.OPERATIONS // 2)]
+        for round_number in range(3):
+            existing = [self.upload(f'round-{round_number}.txt', content).data['id'] for content in contents]
+
+            # Each upload matches content whose only File is being deleted
+            operations = []
+            for file_id, content in zip(existing, contents):
+                operations += [(self.delete, file_id), (self.upload, f'again-{round_number}.txt', content)]
+            with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+                futures = [executor.submit(operation, *args) for operation, *args in operations]
+                statuses = [future.result().status_code for future in futures]
+
+            self.assertEqual(statuses, [204, 201] * len(contents))
+            for content in contents:
+                stored_file = StoredFile.objects.get(file_hash=hashlib.sha256(content).hexdigest())
+                self.assertEqual(stored_file.reference_count, 1)
+                self.assertEqual(stored_file.file_records.get().original_filename, f'again-{round_number}.txt')
+                with open(stored_file.file.path, 'rb') as blob:
+                    self.assertEqual(blob.read(), content)
+            File.objects.all().delete()
+        self.assertFalse(StoredFile.objects.exists())
+        self.assert_storage_stats_exact()
+
+class DeleteCostTests(MediaRootMixin, TestCase):
+    """Deleting a file is metadata-only, so its cost does not depend on the content size"""
+    SMALL = 1024
+    # Sparse, so the blob takes no disk space; copying it would read 1 GiB
+    LARGE = 1024 ** 3
+
+    def setUp(self):
+        super().setUp()
+        # Create the search cache state row up front so it is not counted
+        get_search_cache_version()
+
+    def create_content(self, size, references):
+        file_hash = f'{size:064x}'
+        name = content_path(file_hash)
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as blob:
+            blob.truncate(size)
+        stored_file = StoredFile.objects.create(file=name, file_hash=file_hash, size=size)
+        files = [
+            File.objects.create(stored_file=stored_file, original_filename=f'copy-{i}.bin',
+                                file_type='application/octet-stream', size=size)
+            for i in range(references)
+        ]
+        return stored_file, files
+
+    def timed_delete(self, file_id):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            started = time.monotonic()
+            response = self.client.delete(f'/api/files/{file_id}/')
+            elapsed = time.monotonic() - started
+        self.assertEqual(response.status_code, 204)
+        return len(queries), elapsed
+
+    def test_deleting_a_shared_copy(self):
+        results = {}
+        for size in (self.SMALL, self.LARGE):
+            stored_file, files = self.create_content(size, references=2)
+            inode = os.stat(stored_file.file.path).st_ino
+            results[size] = self.timed_delete(files[0].id)
+
+            # The remaining copy still points at the same, unmoved blob
+            stored_file.refresh_from_db()
+            self.assertEqual(stored_file.reference_count, 1)
+            self.assertEqual(os.stat(stored_file.file.path).st_ino, inode)
+
+        self.assertEqual(results[self.SMALL][0], results[self.LARGE][0])
+        self.assertLess(results[self.LARGE][1], results[self.SMALL][1] + 0.2)
+
+    def test_deleting_the_last_copy(self):
+        results = {}
+        for size in (self.SMALL, self.LARGE):
+            stored_file, files = self.create_content(size, references=1)
+            path = stored_file.file.path
+            results[size] = self.timed_delete(files[0].id)
+
+            self.assertFalse(StoredFile.objects.filter(id=stored_file.id).exists())
+            self.assertFalse(os.path.exists(path))
+
+        self.assertEqual(results[self.SMALL][0], results[self.LARGE][0])
+        self.assertLess(results[self.LARGE][1], results[self.SMALL][1] + 0.2)
+
+class BatchUploadTests(MediaRootMixin, TestCase):
+    """Batch uploads report each file and cost a fixed number of queries"""
+
+    def setUp(self):
+        super().setUp()
+        # Create the search cache state row up front so it is not counted
+        get_search_cache_version()
+
+    def batch(self, files):
+        return self.client.post('/api/files/batch/', {
+            'files': [SimpleUploadedFile(name, content) for name, content in files]
+        }, format='multipart')
+
+    def test_per_file_results(self):
+        self.client.post('/api/files/', {'file': SimpleUploadedFile('stored.txt', b'stored')}, format='multipart')
+
+        response = self.batch([('a.txt', b'new'), ('b.txt', b'new'), ('c.txt', b'stored'), ('d.txt', b'other')])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['uploaded'], response.data['failed']), (4, 0))
+        self.assertEqual(
+            [(result['original_filename'], result['is_reference']) for result in response.data['results']],
+            [('a.txt', False), ('b.txt', True), ('c.txt', True), ('d.txt', False)]
+        )
+        for result in response.data['results']:
+            self.assertEqual(File.objects.get(id=result['id']).original_filename, result['original_filename'])
+        self.assertEqual(
+            sorted(StoredFile.objects.values_list('reference_count', flat=True)), [1, 2, 2]
+        )
+        stats = StorageStats.objects.get(id=StorageStats.SINGLETON_ID)
+        self.assertEqual({field: getattr(stats, field) for field in StorageStats.compute()}, StorageStats.compute())
+
+    def test_invalid_file_does_not_fail_the_batch(self):
+        files = [SimpleUploadedFile('good.txt', b'good'),
+                 SimpleUploadedFile('bad.txt', b'bad', content_type='x' * 101)]
+        response = self.client.post('/api/files/batch/', {'files': files}, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['uploaded'], response.data['failed']), (1, 1))
+        self.assertIn('id', response.data['results'][0])
+        self.assertIn('file_type', response.data['results'][1]['errors'])
+        # Nothing of the invalid file was stored
+        self.assertEqual(StoredFile.objects.get().file_hash, hashlib.sha256(b'good').hexdigest())
+        self.assertEqual(len(os.listdir(get_staging_dir())), 0)
+
+    def test_failed_insert_releases_new_content(self):
+        with mock.patch('files.views.bulk_create_files', side_effect=DatabaseError('insert failed')), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.batch([('a.txt', b'first'), ('b.txt', b'second')])
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(os.path.join(settings.MEDIA_ROOT, 'uploads'))
+                          if files], [])
+        stats = StorageStats.objects.get(id=StorageStats.SINGLETON_ID)
+        self.assertEqual({field: getattr(stats, field) for field in StorageStats.compute()}, StorageStats.compute())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        counts = []
+        for size in (5, 50):
+            files = [(f'{size}-{i}.txt', f'{size} content {i}'.encode()) for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(files)
+            self.assertEqual(response.data['uploaded'], size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_faster_than_single_uploads(self):
+        count = 50
+        started = time.monotonic()
+        for i in range(count):
+            self.client.post('/api/files/', {'file': SimpleUploadedFile(f'single-{i}.txt', f'single {i}'.encode())},
+                             format='multipart')
+        single_rate = count / (time.monotonic() - started)
+
+        started = time.monotonic()
+        response = self.batch([(f'batch-{i}.txt', f'batch {i}'.encode()) for i in range(count)])
+        batch_rate = count / (time.monotonic() - started)
+
+        self.assertEqual(response.data['uploaded'], count)
+        self.assertGreater(batch_rate, single_rate)
+
+class HashingTests(MediaRootMixin, TestCase):
+    """Every registered algorithm digests correctly and fast enough to upload with"""
+
+    # Enough for several read chunks, with a partial one at the end
+    CONTENT = os.urandom(3 * 1024 * 1024 + 123)
+    THROUGHPUT_SIZES = (1024 * 1024, 32 * 1024 * 1024)
+    # A floor far below any of the algorithms, to catch hashing that
+    # serialises or re-reads the upload rather than to benchmark
+    MIN_UPLOAD_THROUGHPUT = 20 * 1024 * 1024
+
+    def upload(self, name, content):
+        return self.client.post('/api/files/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def test_digests_match_reference(self):
+        for algorithm, factory in HASH_ALGORITHMS.items():
+            with self.subTest(algorithm=algorithm):
+                # hashlib's own algorithms are checked against hashlib, the
+                # optional ones against a one-shot digest of the whole content
+                reference = hashlib.new(algorithm) if algorithm in hashlib.algorithms_guaranteed else factory()
+                reference.update(self.CONTENT)
+                expected = reference.hexdigest()
+                hasher = IncrementalHasher(algorithm)
+                for offset in range(0, len(self.CONTENT), 64 * 1024):
+                    hasher.update(self.CONTENT[offset:offset + 64 * 1024])
+                self.assertEqual(hasher.hexdigest(), expected)
+
+                path = os.path.join(settings.MEDIA_ROOT, f'content-{algorithm}')
+                with open(path, 'wb') as f:
+                    f.write(self.CONTENT)
+                self.assertEqual(calculate_path_hash(path, algorithm), expected)
+
+    def test_upload_records_algorithm_and_digest(self):
+        for algorithm, factory in HASH_ALGORITHMS.items():
+            with self.subTest(algorithm=algorithm), override_settings(FILE_HASH_ALGORITHM=algorithm):
+                content = algorithm.encode() * 1000
+                response = self.upload(f'{algorithm}.bin', content)
+                self.assertEqual(response.status_code, 201)
+
+                stored_file = File.objects.get(id=response.data['id']).stored_file
+                hasher = factory()
+                hasher.update(content)
+                self.assertEqual((stored_file.hash_algorithm, stored_file.file_hash), (algorithm, hasher.hexdigest()))
+                self.assertEqual(stored_file.file.name, content_path(stored_file.file_hash))
+
+    def test_upload_throughput(self):
+        rates = {}
+        for algorithm in HASH_ALGORITHMS:
+            for size in self.THROUGHPUT_SIZES:
+                content = os.urandom(size)
+                with override_settings(FILE_HASH_ALGORITHM=algorithm):
+                    started = time.monotonic()
+                    response = self.upload(f'{algorithm}-{size}.bin', content)
+                    rates[algorithm, size] = size / (time.monotonic() - started)
+                self.assertEqual(response.status_code, 201)
+
+        report = ', '.join(f'{algorithm} {size >> 20} MiB: {rate / 2 ** 20:.0f} MiB/s'
+                           for (algorithm, size), rate in rates.items())
+        self.assertGreater(min(rates.values()), self.MIN_UPLOAD_THROUGHPUT, report)
+
+class RehashTests(MediaRootMixin, TestCase):
+    """rehash_stored_files moves blobs along with the digest"""
+
+    def upload(self, content, algorithm):
+        with override_settings(FILE_HASH_ALGORITHM=algorithm):
+            response = self.client.post('/api/files/', {'file': SimpleUploadedFile('file.txt', content)},
+                                        format='multipart')
+        return File.objects.get(id=response.data['id'])
+
+    def rehash(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rehash_stored_files', algorithm='sha256', stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_blob_moves_to_new_content_path(self):
+        file = self.upload(b'legacy content', 'md5')
+        old_path = file.stored_file.file.path
+
+        self.rehash()
+
+        stored_file = StoredFile.objects.get()
+        file_hash = hashlib.sha256(b'legacy content').hexdigest()
+        self.assertEqual((stored_file.hash_algorithm, stored_file.file_hash), ('sha256', file_hash))
+        self.assertEqual(stored_file.file.name, content_path(file_hash))
+        self.assertFalse(os.path.exists(old_path))
+        with stored_file.file.open('rb') as f:
+            self.assertEqual(f.read(), b'legacy content')
+
+        # New uploads of the content now find it
+        self.upload(b'legacy content', 'sha256')
+        self.assertEqual(StoredFile.objects.get().reference_count, 2)
+
+    def test_duplicate_content_is_merged(self):
+        legacy = self.upload(b'shared content', 'md5')
+        current = self.upload(b'shared content', 'sha256')
+        legacy_path = legacy.stored_file.file.path
+
+        self.rehash()
+
+        stored_file = StoredFile.objects.get()
+        self.assertEqual(stored_file.pk, current.stored_file_id)
+        self.assertEqual(stored_file.reference_count, 2)
+        self.assertEqual(File.objects.get(id=legacy.id).stored_file_id, stored_file.pk)
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertTrue(os.path.exists(stored_file.file.path))
+
+class RangeParsingTests(SimpleTestCase):
+    def test_parse_range(self):
+        cases = [
+            (None, None),
+            ('bytes=0-9', (0, 9)),
+            ('bytes=5-', (5, 99)),
+            ('bytes=90-500', (90, 99)),
+            ('bytes=-10', (90, 99)),
+            ('bytes=-500', (0, 99)),
+            ('bytes=-0', 'unsatisfiable'),
+            ('bytes=100-', 'unsatisfiable'),
+            ('bytes=9-5', None),
+            ('bytes=*', None),
+            ('bytes=-', None),
+            ('bytes=0-1,5-9', None),
+            ('items=0-9', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+    def test_etag_matches(self):
+        etag = '"sha256-abc"'
+        self.assertFalse(etag_matches(None, etag))
+        self.assertFalse(etag_matches('', etag))
+        self.assertTrue(etag_matches('*', etag))
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'"other", W/{etag}', etag))
+        self.assertFalse(etag_matches('"sha256-abd"', etag))
+
+class DownloadTests(MediaRootMixin, TestCase):
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post('/api/files/', {'file': SimpleUploadedFile('data.bin', self.CONTENT)},
+                                    format='multipart')
+        self.file = File.objects.get(id=response.data['id'])
+        self.url = f'/api/files/{self.file.id}/download/'
+        self.etag = get_etag(self.file.stored_file)
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_full_download(self):
+        response, content = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.CONTENT)
+        self.assertEqual(response['ETag'], self.etag)
+
+    def test_not_modified(self):
+        response, content = self.download(**{'If-None-Match': self.etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(content, b'')
+
+    def test_ranges(self):
+        for header, start, end in [('bytes=10-19', 10, 19), ('bytes=-24', 1000, 1023), ('bytes=1000-', 1000, 1023)]:
+            with self.subTest(header=header):
+                response, content = self.download(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(content, self.CONTENT[start:end + 1])
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/1024')
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.download(Range='bytes=1024-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_if_range(self):
+        response, content = self.download(Range='bytes=0-9', **{'If-Range': self.etag})
+        self.assertEqual((response.status_code, content), (206, self.CONTENT[:10]))
+
+        # A stale validator means the range may not fit the client's copy
+        response, content = self.download(Range='bytes=0-9', **{'If-Range': '"sha256-stale"'})
+        self.assertEqual((response.status_code, content), (200, self.CONTENT))
+
+    def test_missing_blob(self):
+        os.remove(self.file.stored_file.file.path)
+        with self.assertLogs('files', 'ERROR') as logs:
+            response, _ = self.download()
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(str(self.file.id), logs.output[0])
+
+    async def test_missing_blob_async(self):
+        os.remove(self.file.stored_file.file.path)
+        with self.assertLogs('files', 'ERROR'):
+            response = await download_file(AsyncRequestFactory().get(self.url), self.file.id)
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_stored_file(self):
+        File.objects.filter(id=self.file.id).update(stored_file=None)
+        with self.assertLogs('files', 'ERROR'):
+            response, _ = self.download()
+        self.assertEqual(response.status_code, 404)
+
+class UploadSessionTests(MediaRootMixin, TestCase):
+    """Resumable uploads assemble parts by number and complete exactly once"""
+
+    PART_SIZE = MIN_PART_SIZE
+    # Two full parts and a short last one
+    CONTENT = os.urandom(2 * MIN_PART_SIZE + 1000)
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post('/api/uploads/', {
+            'original_filename': 'large.bin', 'size': len(self.CONTENT), 'part_size': self.PART_SIZE
+        }, format='json')
+        self.assertEqual(response.data['part_count'], 3)
+        self.session = UploadSession.objects.get(id=response.data['id'])
+        self.url = f'/api/uploads/{self.session.id}/'
+
+    def put_part(self, part_number, data=None):
+        if data is None:
+            data = self.CONTENT[part_number * self.PART_SIZE:(part_number + 1) * self.PART_SIZE]
+        return self.client.put(f'{self.url}parts/{part_number}/', data, content_type='application/octet-stream')
+
+    def complete(self):
+        return self.client.post(f'{self.url}complete/')
+
+    def test_parts_in_any_order(self):
+        for part_number in (2, 0, 1):
+            self.assertEqual(self.put_part(part_number).status_code, 200)
+        self.assertEqual(self.client.get(self.url).data['received_parts'], [0, 1, 2])
+
+        response = self.complete()
+
+        self.assertEqual(response.status_code, 201)
+        with File.objects.get(id=response.data['id']).stored_file.file.open('rb') as f:
+            self.assertEqual(f.read(), self.CONTENT)
+        self.assertFalse(os.path.exists(get_session_dir(self.session)))
+
+    def test_short_part_is_rejected(self):
+        response = self.put_part(0, self.CONTENT[:self.PART_SIZE - 1])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url).data['received_parts'], [])
+        self.assertEqual(os.listdir(get_session_dir(self.session)), [])
+
+    def test_complete_with_missing_part(self):
+        self.put_part(0)
+        self.put_part(2)
+
+        self.assertEqual(self.complete().status_code, 400)
+        # The session can still be finished
+        self.put_part(1)
+        self.assertEqual(self.complete().status_code, 201)
+
+    def test_complete_twice(self):
+        for part_number in range(3):
+            self.put_part(part_number)
+
+        self.assertEqual(self.complete().status_code, 201)
+        self.assertEqual(self.complete().status_code, 404)
+        self.assertEqual(File.objects.count(), 1)
+        self.assertEqual(StoredFile.objects.get().reference_count, 1)
+
+    def test_complete_while_completing(self):
+        for part_number in range(3):
+            self.put_part(part_number)
+        UploadSession.objects.filter(id=self.session.id).update(completing=True)
+
+        self.assertEqual(self.complete().status_code, 409)
+        self.assertEqual(self.put_part(0).status_code, 409)
+        self.assertFalse(File.objects.exists())
+
+class DisconnectingPayload:
+    """wsgi.input that fails partway through, like a client that disconnects mid-body"""
+
+    def __init__(self, content, fail_after):
+        self.stream = io.BytesIO(content)
+        self.fail_after = fail_after
+
+    def read(self, size=-1):
+        remaining = self.fail_after - self.stream.tell()
+        if remaining <= 0:
+            raise UnreadablePostError('Client disconnected')
+        return self.stream.read(remaining if size < 0 else min(size, remaining))
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+class StagingCleanupTests(MediaRootMixin, TestCase):
+    """Aborted uploads leave nothing behind in the staging directory"""
+
+    def post_disconnecting(self, action, files, fail_after):
+        content = encode_multipart(BOUNDARY, {name: [SimpleUploadedFile(filename, data) for filename, data in uploads]
+                                              for name, uploads in files.items()})
+        request = APIRequestFactory().generic(
+            'POST', '/api/files/', content, content_type=MULTIPART_CONTENT,
+            **{'wsgi.input': DisconnectingPayload(content, fail_after)}
+        )
+        with self.assertRaises(UnreadablePostError):
+            FileViewSet.as_view({'post': action})(request)
+
+    def staged_files(self):
+        return os.listdir(get_staging_dir())
+
+    def test_disconnect_mid_file(self):
+        self.post_disconnecting('create', {'file': [('big.bin', os.urandom(4 * 1024 * 1024))]}, 3 * 1024 * 1024)
+        self.assertEqual(self.staged_files(), [])
+
+    def test_disconnect_after_a_completed_file(self):
+        first, second = os.urandom(1024 * 1024), os.urandom(4 * 1024 * 1024)
+        self.post_disconnecting('batch', {'files': [('first.bin', first), ('second.bin', second)]},
+                                len(first) + 2 * 1024 * 1024)
+        self.assertEqual(self.staged_files(), [])
+        self.assertFalse(File.objects.exists())
+
+    def test_purge_stale_staging_files(self):
+        staging_dir = get_staging_dir()
+        for name in ('stale.upload', 'fresh.upload'):
+            with open(os.path.join(staging_dir, name), 'wb') as staged:
+                staged.write(b'partial')
+        stale_time = time.time() - settings.UPLOAD_STAGING_MAX_AGE - 60
+        os.utime(os.path.join(staging_dir, 'stale.upload'), (stale_time, stale_time))
+
+        self.assertEqual(purge_stale_staging_files(), 1)
+        self.assertEqual(self.staged_files(), ['fresh.upload'])
+
+class AsyncStaticFilesTests(SimpleTestCase):
+    """Under ASGI, static files are served without adapting the middleware to a thread"""
+
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        with open(os.path.join(static_root, 'app.css'), 'w') as static_file:
+            static_file.write('body { margin: 0 }')
+        static_override = override_settings(STATIC_ROOT=static_root, STATIC_URL='/static/')
+        static_override.enable()
+        self.addCleanup(static_override.disable)
+
+        async def get_response(request):
+            return HttpResponse('from the view')
+        self.middleware = AsyncWhiteNoiseMiddleware(get_response)
+
+    def test_runs_as_async_middleware(self):
+        self.assertTrue(iscoroutinefunction(self.middleware))
+
+    async def test_serves_static_file(self):
+        response = await self.middleware(AsyncRequestFactory().get('/static/app.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/css'))
+        self.assertEqual(response['Content-Length'], '18')
+        self.assertEqual(b''.join([chunk async for chunk in response]), b'body { margin: 0 }')
+
+    async def test_not_modified(self):
+        response = await self.middleware(AsyncRequestFactory().get('/static/app.css'))
+        response = await self.middleware(AsyncRequestFactory().get(
+            '/static/app.css', headers={'If-None-Match': response['ETag']}
+        ))
+        self.assertEqual(response.status_code, 304)
+
+    async def test_other_paths_reach_the_view(self):
+        response = await self.middleware(AsyncRequestFactory().get('/api/files/'))
+        self.assertEqual(response.content, b'from the view')
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class DetailRouteFilterTests(MediaRootMixin, TestCase):
+    """List filters in the query string do not apply to a single file"""
+
+    def test_list_filters_are_ignored(self):
+        response = self.client.post('/api/files/', {'file': SimpleUploadedFile('notes.txt', b'notes')},
+                                    format='multipart')
+        url = f"/api/files/{response.data['id']}/"
+        query = '?file_type=image&min_size=1000000&end_date=2000-01-01'
+
+        self.assertEqual(self.client.get('/api/files/' + query).data['files'], [])
+        self.assertEqual(self.client.get(url + query).status_code, 200)
+        self.assertEqual(self.client.get(url + 'download/' + query).status_code, 200)
+        self.assertEqual(self.client.delete(url + query).status_code, 204)
+
+class FileListQueryPlanTests(TestCase):
+    """The filtered listing is served by the (category, uploaded_at, id) index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_files(20, 'application/pdf')
+        create_files(20, 'image/png')
+
+    def test_type_filter_uses_composite_index(self):
+        index_name = next(index.name for index in File._meta.indexes if index.fields == ['category', 'uploaded_at', 'id'])
+        queryset = File.objects.select_related('stored_file').filter(
+            category=get_file_category('application/pdf')
+        ).order_by(*FileCursorPagination.ordering)[:FileCursorPagination.page_size + 1]
+
+        plan = queryset.explain()
+
+        self.assertIn(f'SEARCH files_metadata USING INDEX {index_name} (category=?)', plan)
+        # The index order satisfies ORDER BY, so no sort step is needed
+        self.assertNotIn('TEMP B-TREE', plan)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FileListQueryCountTests(TestCase):
+    """The list page runs a fixed number of queries however many rows it returns"""
+
+    def setUp(self):
+        cache.clear()
+        # Create the search cache state row up front so it is not counted
+        get_search_cache_version()
+
+    def list_files(self, expected_rows):
+        response = self.client.get('/api/files/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['files']), expected_rows)
+        return response
+
+    def test_query_count_does_not_grow_with_rows(self):
+        create_files(3)
+        # The page itself, the cache version and the total
+        with self.assertNumQueries(3):
+            self.list_files(3)
+
+        create_files(40, 'image/png')
+        cache.clear()
+        with self.assertNumQueries(3):
+            self.list_files(FileCursorPagination.page_size)
+
+    def test_cached_total_skips_count(self):
+        create_files(3)
+        self.list_files(3)
+        with self.assertNumQueries(2):
+            self.list_files(3)
@@ -0,0 +1,379 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from itertools import islice
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework.parsers import MultiPartParser
+from .file_types import get_file_category
+from .hashing import HASH_READ_SIZE, IncrementalHasher
+from .indexing import enqueue
+from .models import File, StorageStats, StoredFile, UploadSession, claim_stored_files
+from .search_cache import invalidate_search_cache
+from .storage import content_lock, content_path, content_storage
+
+logger = logging.getLogger('files')
+
+# Missing part numbers listed in the error when completing too early
+MISSING_PARTS_REPORTED = 20
+
+# Staging area for in-flight uploads; kept under MEDIA_ROOT so promotion is a rename
+STAGING_DIR = os.path.join('uploads', '.staging')
+
+# Parts of resumable upload sessions, one directory per session
+SESSIONS_DIR = os.path.join('uploads', '.sessions')
+
+def get_staging_dir():
+    """Return the absolute staging directory, creating it if needed"""
+    staging_dir = os.path.join(settings.MEDIA_ROOT, STAGING_DIR)
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+class StagedUploadedFile(UploadedFile):
+    """
+    An upload that was streamed into the staging directory, with its
+    content hash computed while the bytes arrived.
+    """
+
+    def __init__(self, file, name, content_type, size, charset, content_type_extra=None,
+                 file_hash=None, hash_algorithm=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.file_hash = file_hash
+        self.hash_algorithm = hash_algorithm
+        self.promoted = False
+
+    def temporary_file_path(self):
+        """Return the full path of the staged file."""
+        return self.file.name
+
+    def promote(self, name):
+        """Atomically move the staged file to `name` (relative to MEDIA_ROOT)"""
+        target = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.temporary_file_path(), target)
+        if settings.FILE_UPLOAD_PERMISSIONS is not None:
+            os.chmod(target, settings.FILE_UPLOAD_PERMISSIONS)
+        self.promoted = True
+        return name
+
+    def close(self):
+        """Close the file and discard it unless it was promoted into storage"""
+        path = self.temporary_file_path()
+        self.file.close()
+        if not self.promoted:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class HashingFileUploadHandler(FileUploadHandler):
+    """
+    Upload handler that hashes each chunk as it is written to a staging
+    file, so the upload is read and written exactly once.
+    """
+    chunk_size = 1024 * 1024
+
+    def new_file(self, *args, **kwargs):
+        """
+        Create the staging file to append to as data is coming in.
+        """
+        super().new_file(*args, **kwargs)
+        # A previous file that was skipped never reached file_complete
+        self.discard_partial_file()
+        self.file = tempfile.NamedTemporaryFile(suffix='.upload', dir=get_staging_dir(), delete=False)
+        self.hasher = IncrementalHasher()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        # From here on the StagedUploadedFile owns (and removes) the file
+        staged = StagedUploadedFile(
+            self.file, self.file_name, self.content_type, file_size,
+            self.charset, self.content_type_extra,
+            file_hash=self.hasher.hexdigest(), hash_algorithm=self.hasher.algorithm
+        )
+        del self.file
+        return staged
+
+    def discard_partial_file(self):
+        """Remove the staging file of a file that did not complete, if any"""
+        if hasattr(self, 'file'):
+            self.file.close()
+            try:
+                os.remove(self.file.name)
+            except FileNotFoundError:
+                pass
+            del self.file
+
+    def upload_interrupted(self):
+        self.discard_partial_file()
+
+    def upload_complete(self):
+        # Also reached after StopUpload, which leaves the current file open
+        self.discard_partial_file()
+
+class StagingMultiPartParser(MultiPartParser):
+    """
+    Multipart parser that discards a partly staged file when parsing
+    fails. Django's parser only tells the upload handlers for StopUpload;
+    a client disconnecting mid-body raises UnreadablePostError instead,
+    which would leave the partial file in the staging directory.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return super().parse(stream, media_type, parser_context)
+        except BaseException:
+            for handler in parser_context['request'].upload_handlers:
+                if hasattr(handler, 'discard_partial_file'):
+                    handler.discard_partial_file()
+            raise
+
+def store_content(file_obj, file_hash):
+    """
+    Put new content at its content-addressed path and return the name.
+    Staged uploads are renamed into place; any other upload object is
+    copied through the storage backend.
+    """
+    name = content_path(file_hash)
+    if isinstance(file_obj, StagedUploadedFile):
+        file_obj.promote(name)
+        logger.info(f"Promoted staged upload to {name}")
+        return name
+    return content_storage.save(name, file_obj)
+
+def claim_existing(hash_algorithm, file_hashes):
+    """Claim the stored rows for the given hashes; returns {file_hash: stored_file}"""
+    stored_files = StoredFile.objects.filter(hash_algorithm=hash_algorithm, file_hash__in=file_hashes)
+    return {stored_file.file_hash: stored_file for stored_file in claim_stored_files(list(stored_files))}
+
+def get_or_create_stored_file(file_obj, file_hash, hash_algorithm):
+    """
+    Return (stored_file, created) for the upload's content, holding a
+    reference claimed for the caller (see claim_stored_files). Create the
+    File and then call release_stored_files, whether or not that worked.
+
+    Duplicates are claimed before any bytes move. New content is stored
+    and its row created under the content lock, after claiming once more
+    in case a concurrent upload of the same content got there first. Call
+    in autocommit, so the row is committed before the lock is released.
+    """
+    stored_file = claim_existing(hash_algorithm, [file_hash]).get(file_hash)
+    if stored_file is None:
+        with content_lock(content_path(file_hash)):
+            stored_file = claim_existing(hash_algorithm, [file_hash]).get(file_hash)
+            if stored_file is None:
+                name = store_content(file_obj, file_hash)
+                stored_file = StoredFile.objects.create(
+                    hash_algorithm=hash_algorithm, file_hash=file_hash,
+                    file=name, size=file_obj.size, reference_count=1,
+                )
+                return stored_file, True
+
+    # Discard the staged copy; the content is already stored
+    file_obj.close()
+    return stored_file, False
+
+def get_or_create_stored_files(uploads):
+    """
+    Batch counterpart of get_or_create_stored_file. `uploads` maps each
+    (hash_algorithm, file_hash) to one file object with that content.
+
+    Existing content is claimed with one UPDATE per hash algorithm; the
+    rest is stored and inserted with one bulk_create under the content
+    locks. Returns ({key: (stored_file, created)}, {key: error}), with a
+    reference claimed on every returned row. Like get_or_create_stored_file,
+    call it outside a transaction.
+    """
+    def claim(keys):
+        claimed = {}
+        for algorithm in {algorithm for algorithm, _ in keys}:
+            for file_hash, stored_file in claim_existing(algorithm, [h for a, h in keys if a == algorithm]).items():
+                claimed[(algorithm, file_hash)] = (stored_file, False)
+                # Discard the staged copy; the content is already stored
+                uploads[(algorithm, file_hash)].close()
+        return claimed
+
+    stored = claim(list(uploads))
+    new_keys = [key for key in uploads if key not in stored]
+    errors = {}
+    if not new_keys:
+        return stored, errors
+
+    with content_lock(*[content_path(file_hash) for _, file_hash in new_keys]):
+        stored.update(claim(new_keys))
+        new = []
+        for key in new_keys:
+            if key in stored:
+                continue
+            file_obj = uploads[key]
+            hash_algorithm, file_hash = key
+            try:
+                name = store_content(file_obj, file_hash)
+            except OSError as e:
+                logger.error(f"Error storing {file_obj.name}: {e}")
+                errors[key] = str(e)
+                continue
+            new.append(StoredFile(hash_algorithm=hash_algorithm, file_hash=file_hash, file=name,
+                                  size=file_obj.size, reference_count=1))
+        if new:
+            with transaction.atomic():
+                StoredFile.objects.bulk_create(new)
+                # bulk_create skips StoredFile.save(), which keeps these counters
+                StorageStats.adjust(unique_files=len(new), actual_size=sum(stored_file.size for stored_file in new))
+            for stored_file in new:
+                stored[(stored_file.hash_algorithm, stored_file.file_hash)] = (stored_file, True)
+    return stored, errors
+
+def bulk_create_files(files):
+    """
+    Insert File rows with one bulk_create and do what File.save() and the
+    post_save signal do per row: set the category, add the references in
+    one UPDATE, adjust the storage counters and queue index updates for
+    the new files. Call inside a transaction.
+    """
+    if not files:
+        return []
+    for file_record in files:
+        file_record.category = get_file_category(file_record.file_type)
+    File.objects.bulk_create(files)
+
+    references = Counter(file_record.stored_file_id for file_record in files)
+    StoredFile.objects.filter(id__in=references).update(reference_count=F('reference_count') + Case(
+        *[When(id=stored_file_id, then=Value(count)) for stored_file_id, count in references.items()],
+        output_field=IntegerField(),
+    ))
+    StorageStats.adjust(total_files=len(files), total_size=sum(file_record.size for file_record in files))
+
+    enqueue([file_record.id for file_record in files])
+    transaction.on_commit(invalidate_search_cache)
+    return files
+
+def get_session_dir(session):
+    """Return the absolute directory holding a session's parts"""
+    return os.path.join(settings.MEDIA_ROOT, SESSIONS_DIR, str(session.id))
+
+def get_part_path(session, part_number):
+    return os.path.join(get_session_dir(session), f'{part_number}.part')
+
+def get_received_parts(session):
+    """Return the sorted part numbers that have been fully received"""
+    try:
+        names = os.listdir(get_session_dir(session))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-len('.part')]) for name in names if name.endswith('.part'))
+
+def write_session_part(session, part_number, stream):
+    """
+    Write one part of an upload session from `stream`.
+
+    The part is written under a temporary name and renamed once complete,
+    so parts can arrive concurrently, out of order, or be re-sent.
+    Raises ValueError if the body is not exactly the expected size.
+    """
+    expected = session.expected_part_size(part_number)
+    session_dir = get_session_dir(session)
+    os.makedirs(session_dir, exist_ok=True)
+
+    part_file = tempfile.NamedTemporaryFile(suffix='.tmp', dir=session_dir, delete=False)
+    written = 0
+    try:
+        with part_file:
+            # Read one byte past the expected size so oversized bodies are caught
+            while written <= expected:
+                chunk = stream.read(min(HASH_READ_SIZE, expected + 1 - written))
+                if not chunk:
+                    break
+                part_file.write(chunk)
+                written += len(chunk)
+        if written != expected:
+            raise ValueError(f'Part {part_number} must be {expected} bytes')
+        os.replace(part_file.name, get_part_path(session, part_number))
+    except BaseException:
+        try:
+            os.remove(part_file.name)
+        except FileNotFoundError:
+            pass
+        raise
+    return written
+
+def assemble_session(session):
+    """
+    Concatenate a session's parts into a staged upload, hashing the bytes
+    as they are copied. Raises ValueError listing any missing parts.
+    """
+    received = set(get_received_parts(session))
+    if len(received) < session.part_count:
+        # Stops after a few gaps, so it never walks more than the received parts
+        missing = list(islice((n for n in range(session.part_count) if n not in received), MISSING_PARTS_REPORTED))
+        raise ValueError(f'Missing {session.part_count - len(received)} parts: {missing}')
+
+    staged = tempfile.NamedTemporaryFile(suffix='.upload', dir=get_staging_dir(), delete=False)
+    hasher = IncrementalHasher()
+    try:
+        for part_number in range(session.part_count):
+            with open(get_part_path(session, part_number), 'rb') as part:
+                for chunk in iter(lambda: part.read(HASH_READ_SIZE), b''):
+                    hasher.update(chunk)
+                    staged.write(chunk)
+        staged.flush()
+        staged.seek(0)
+    except BaseException:
+        staged.close()
+        os.remove(staged.name)
+        raise
+
+    return StagedUploadedFile(
+        staged, session.original_filename, session.file_type, session.size, None,
+        file_hash=hasher.hexdigest(), hash_algorithm=hasher.algorithm
+    )
+
+def discard_session(session):
+    """Remove a session's parts and its database row"""
+    shutil.rmtree(get_session_dir(session), ignore_errors=True)
+    session.delete()
+
+def purge_stale_staging_files():
+    """
+    Remove staging files nothing has written to for UPLOAD_STAGING_MAX_AGE
+    seconds, left behind by a crashed worker. Returns how many were removed.
+    """
+    staging_dir = get_staging_dir()
+    cutoff = time.time() - settings.UPLOAD_STAGING_MAX_AGE
+    count = 0
+    with os.scandir(staging_dir) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    count += 1
+            except FileNotFoundError:
+                # Promoted or removed by its request meanwhile
+                continue
+    if count:
+        logger.info(f"Removed {count} stale staging files")
+    return count
+
+def purge_expired_sessions(limit=None):
+    """Discard sessions past their expiry; returns how many were removed"""
+    expired = UploadSession.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+    if limit is not None:
+        expired = expired[:limit]
+    count = 0
+    for session in expired:
+        logger.info(f"Discarding expired upload session {session.id}")
+        discard_session(session)
+        count += 1
+    return count
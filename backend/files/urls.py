@@ -1,10 +1,23 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FileViewSet
+from .views import FileViewSet, UploadSessionViewSet
 
 router = DefaultRouter()
 router.register(r'files', FileViewSet)
+router.register(r'uploads', UploadSessionViewSet)
 
-urlpatterns = [
+urlpatterns = []
+
+# Under ASGI, search and download are served by native async views, which
+# take precedence over the viewset's actions on the same paths
+if settings.ASYNC_VIEWS:
+    from .async_views import download_file, search_files
+    urlpatterns += [
+        path('files/search/', search_files),
+        path('files/<uuid:file_id>/download/', download_file),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -1,93 +1,148 @@
 from django.shortcuts import render
-from rest_framework import viewsets, status, pagination
+from rest_framework import viewsets, status, pagination, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.utils.encoders import JSONEncoder
 from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
 from elasticsearch_dsl import Q
 from .models import File
 from .documents import FileDocument
-from .serializers import FileSerializer
+from .serializers import FileSerializer, FileListSerializer, SearchHitSerializer, UploadSessionSerializer
 import hashlib
+import io
+import json
 import logging
-from .models import StoredFile
-from django.db import models
+import random
+import time
+from .models import StoredFile, StorageStats, UploadSession, claim_stored_files, release_stored_files
+from .uploads import (
+    get_or_create_stored_file, get_or_create_stored_files, bulk_create_files,
+    write_session_part, assemble_session, discard_session, purge_expired_sessions,
+)
+from .hashing import calculate_file_hash, get_hash_algorithm
+from .downloads import serve_file
+from .indexing import get_outbox_stats
+from .search_cache import get_search_cache_version, get_search_cache_stats, record_search_cache_lookup
+from .file_types import CATEGORY_MIME_TYPES, CATEGORY_OTHER, get_file_category, get_mime_type_from_extension
 
 logger = logging.getLogger('files')
+search_logger = logging.getLogger('files.search')
 
-# Cache version key for search results
-SEARCH_CACHE_VERSION_KEY = 'file_search_cache_version'
-# Default version if not set
-DEFAULT_CACHE_VERSION = 1
-
-# Get current search cache version
-def get_search_cache_version():
-    version = cache.get(SEARCH_CACHE_VERSION_KEY, DEFAULT_CACHE_VERSION)
-    return version
-
-# Increment search cache version to invalidate all search caches
-def invalidate_search_cache():
-    version = get_search_cache_version()
-    cache.set(SEARCH_CACHE_VERSION_KEY, version + 1)
-    logger.info(f"Search cache invalidated. New version: {version + 1}")
-
-# List of known MIME types and their extensions
-KNOWN_FILE_TYPES = {
-    'application/pdf': ['.pdf'],
-    'image/png': ['.png'],
-    'image/jpeg': ['.jpg', '.jpeg'],
-    'image/gif': ['.gif'],
-    'text/plain': ['.txt'],
-    'text/x-python': ['.py'],
-    'application/json': ['.json'],
-    'text/csv': ['.csv'],
-    'text/markdown': ['.md'],
-    'application/parquet': ['.parquet'],
-    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
-    'application/vnd.ms-excel': ['.xls'],
-    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx'],
-    'application/msword': ['.doc'],
-    'application/vnd.ms-powerpoint': ['.ppt'],
-    'application/vnd.openxmlformats-officedocument.presentationml.presentation': ['.pptx'],
-    'application/zip': ['.zip'],
-    'application/x-rar-compressed': ['.rar'],
-    'application/x-7z-compressed': ['.7z'],
-    'application/x-tar': ['.tar'],
-    'application/gzip': ['.gz'],
-    'text/html': ['.html', '.htm'],
-    'text/css': ['.css'],
-    'application/javascript': ['.js'],
-    'application/typescript': ['.ts'],
-    'text/x-java-source': ['.java'],
-    'text/x-c': ['.c'],
-    'text/x-c++': ['.cpp'],
-    'text/x-c-header': ['.h'],
-    'text/x-c++-header': ['.hpp'],
-    'text/x-go': ['.go'],
-    'text/x-rust': ['.rs'],
-    'text/x-ruby': ['.rb'],
-    'text/x-php': ['.php'],
-    'text/x-shellscript': ['.sh'],
-    'application/x-msdos-program': ['.bat'],
-    'application/x-powershell': ['.ps1'],
-    'application/sql': ['.sql'],
-    'application/x-yaml': ['.yaml', '.yml'],
-    'application/toml': ['.toml']
-}
-
-def calculate_file_hash(file_obj):
-    """Calculate MD5 hash of a file"""
-    md5_hash = hashlib.md5()
-    for chunk in file_obj.chunks():
-        md5_hash.update(chunk)
-    return md5_hash.hexdigest()
-
-def get_mime_type_from_extension(extension):
-    """Get MIME type from file extension"""
-    for mime_type, extensions in KNOWN_FILE_TYPES.items():
-        if extension.lower() in [ext.lower() for ext in extensions]:
-            return mime_type
-    return 'application/octet-stream'
+# How long an approximate list total stays cached (seconds)
+FILE_COUNT_CACHE_TIMEOUT = getattr(settings, 'FILE_COUNT_CACHE_TIMEOUT', 30)
+
+# Rows fetched per round-trip when streaming an NDJSON export
+EXPORT_CHUNK_SIZE = 2000
+
+# Default and maximum number of type-ahead suggestions
+SUGGEST_SIZE = 8
+MAX_SUGGEST_SIZE = 20
+
+def log_search(query, file_type, page, page_size, elapsed_ms, took_ms=None, hits=None, cache_hit=False):
+    """
+    Emit search telemetry: every search slower than SEARCH_SLOW_QUERY_MS as a
+    warning, plus a SEARCH_LOG_SAMPLE_RATE sample of the rest at INFO. Nothing
+    is built for searches that are neither slow nor sampled.
+    """
+    if elapsed_ms >= settings.SEARCH_SLOW_QUERY_MS:
+        level = logging.WARNING
+    elif random.random() < settings.SEARCH_LOG_SAMPLE_RATE:
+        level = logging.INFO
+    else:
+        return
+    if not search_logger.isEnabledFor(level):
+        return
+
+    # The shape of the query, not its text
+    shape = {
+        'terms': len(query.split()),
+        'length': len(query),
+        'file_type': bool(file_type),
+        'page': page,
+        'page_size': page_size,
+    }
+    telemetry = {
+        'elapsed_ms': round(elapsed_ms, 1),
+        'took_ms': took_ms,
+        'hits': hits,
+        'cache': 'hit' if cache_hit else 'miss',
+        'shape': shape,
+    }
+    search_logger.log(
+        level, '%s search: elapsed_ms=%.1f took_ms=%s hits=%s cache=%s shape=%s',
+        'Slow' if level == logging.WARNING else 'Sampled',
+        elapsed_ms, took_ms, hits, telemetry['cache'], shape,
+        extra={'search': telemetry},
+    )
+
+def build_file_search(search, query, file_type, page, page_size):
+    """Apply the filename query, file type filter and page window to a Search or AsyncSearch"""
+    # Match whole words, word prefixes (edge-ngram subfield), substrings
+    # (trigram subfield) and typos, all against pre-analyzed terms
+    search = search.query(
+        Q('bool',
+          should=[
+              Q('match_phrase', original_filename={'query': query, 'slop': 2, 'boost': 3}),
+              Q('match', **{'original_filename.prefix': {'query': query, 'operator': 'and', 'boost': 2}}),
+              Q('match', **{'original_filename.trigram': {'query': query, 'operator': 'and'}}),
+              Q('match', original_filename={'query': query, 'fuzziness': 'AUTO'})
+          ],
+          minimum_should_match=1)
+    )
+
+    # Apply file type filter if provided
+    if file_type:
+        if '/' in file_type:
+            search = search.filter('term', file_type=file_type)
+        else:
+            mime_type = get_mime_type_from_extension(f'.{file_type}')
+            search = search.filter('term', file_type=mime_type)
+
+    # Apply pagination
+    start = (page - 1) * page_size
+    return search[start:start + page_size]
+
+def serialize_search_hits(hits, context):
+    """
+    Serialize search hits from their _source, in relevance order. One
+    query checks that the page's files still exist and fetches their live
+    reference counts, so files deleted since indexing (while their delete
+    task waits in the outbox) are dropped. Only hits indexed without the
+    stored file fields are loaded in full from the database.
+    """
+    reference_counts = {
+        str(file_id): reference_count
+        for file_id, reference_count in File.objects.filter(
+            id__in=[hit.meta.id for hit in hits]
+        ).values_list('id', 'stored_file__reference_count')
+    }
+    hits = [hit for hit in hits if hit.meta.id in reference_counts]
+    hit_serializer = SearchHitSerializer(context=dict(context, reference_counts=reference_counts))
+    stale_ids = [hit.meta.id for hit in hits if not SearchHitSerializer.is_complete(hit)]
+    stale = {}
+    if stale_ids:
+        list_serializer = FileListSerializer(context=context)
+        for instance in File.objects.select_related('stored_file').filter(id__in=stale_ids):
+            stale[str(instance.id)] = list_serializer.to_representation(instance)
+
+    files = []
+    for hit in hits:
+        if SearchHitSerializer.is_complete(hit):
+            files.append(hit_serializer.to_representation(hit))
+        elif hit.meta.id in stale:
+            files.append(stale[hit.meta.id])
+    return files
+
+# Maximum number of hashes accepted by a single probe request
+MAX_PROBE_HASHES = 1000
+
+# Expired upload sessions removed opportunistically when a new one starts
+EXPIRED_SESSION_PURGE_LIMIT = 10
 
 # Configure pagination
 class FilePagination(pagination.PageNumberPagination):
@@ -95,56 +150,149 @@ class FilePagination(pagination.PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class FileCursorPagination(pagination.CursorPagination):
+    """Keyset pagination over (uploaded_at, id) so each page is a single range scan"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-uploaded_at', '-id')
+
 # Create your views here.
 class FileViewSet(viewsets.ModelViewSet):
-    queryset = File.objects.all()
+    queryset = File.objects.select_related('stored_file')
     serializer_class = FileSerializer
-    pagination_class = FilePagination
+    pagination_class = FileCursorPagination
+
+    def get_serializer_class(self):
+        # Read-heavy endpoints use the flat serializer; writes keep full validation
+        if self.action in ('list', 'search'):
+            return FileListSerializer
+        return super().get_serializer_class()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
-    def list(self, request, *args, **kwargs):
-        logger.info(f"Listing files with params: {request.query_params}")
-        queryset = self.get_queryset()
-        
-        # Apply filters if provided
-        file_type = request.query_params.get('file_type')
+    def filter_listing(self, queryset):
+        """
+        Apply the file_type, size and date filters from the query string.
+        Only the listing and its export use this: detail routes (retrieve,
+        download, destroy) must find a file whatever query string they get.
+        """
+        queryset = self.filter_by_type(queryset)
+        return self.filter_by_size_and_date(queryset)
+
+    def filter_by_type(self, queryset):
+        file_type = self.request.query_params.get('file_type')
         logger.info(f"File type filter: {file_type}")
-        if file_type:
-            if file_type == 'other':
-                # Filter out files with known MIME types
-                queryset = queryset.exclude(file_type__in=KNOWN_FILE_TYPES.keys())
-            # Check if it's a MIME type (contains '/')
-            elif '/' in file_type:
-                queryset = queryset.filter(file_type=file_type)
-            else:
-                # Filter by file extension
-                mime_type = get_mime_type_from_extension(f'.{file_type}')
-                queryset = queryset.filter(file_type=mime_type)
-            
-        min_size = request.query_params.get('min_size')
+        if not file_type:
+            return queryset
+
+        if file_type == 'other':
+            # Files whose MIME type is not a known one
+            return queryset.filter(category=CATEGORY_OTHER)
+
+        # A MIME type (contains '/') or a file extension
+        mime_type = file_type if '/' in file_type else get_mime_type_from_extension(f'.{file_type}')
+        category = get_file_category(mime_type)
+        if category == CATEGORY_OTHER:
+            return queryset.filter(category=CATEGORY_OTHER, file_type=mime_type)
+        return queryset.filter(category=category)
+
+    def filter_by_size_and_date(self, queryset):
+        params = self.request.query_params
+
+        min_size = params.get('min_size')
         if min_size:
             queryset = queryset.filter(size__gte=int(min_size))
-            
-        max_size = request.query_params.get('max_size')
+
+        max_size = params.get('max_size')
         if max_size:
             queryset = queryset.filter(size__lte=int(max_size))
-            
-        start_date = request.query_params.get('start_date')
+
+        start_date = params.get('start_date')
         if start_date:
             queryset = queryset.filter(uploaded_at__gte=start_date)
-            
-        end_date = request.query_params.get('end_date')
+
+        end_date = params.get('end_date')
         if end_date:
             queryset = queryset.filter(uploaded_at__lte=end_date)
-            
-        serializer = self.get_serializer(queryset, many=True)
+
+        return queryset
+
+    def get_cached_count(self, queryset):
+        """
+        Return the total for a filtered listing, cached per filter combination.
+        The value may lag behind by up to FILE_COUNT_CACHE_TIMEOUT seconds.
+        """
+        params = self.request.query_params
+        filters = [(key, params.get(key, '')) for key in ('file_type', 'min_size', 'max_size', 'start_date', 'end_date')]
+        filters_digest = hashlib.md5(repr(filters).encode()).hexdigest()
+        cache_key = f'file_count_{filters_digest}_v{get_search_cache_version()}'
+
+        total = cache.get(cache_key)
+        if total is None:
+            total = queryset.count()
+            cache.set(cache_key, total, timeout=FILE_COUNT_CACHE_TIMEOUT)
+        return total
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        File counts per type for the current size and date filters (the
+        file_type filter itself is ignored), from one GROUP BY on category.
+        """
+        params = request.query_params
+        filters = [(key, params.get(key, '')) for key in ('min_size', 'max_size', 'start_date', 'end_date')]
+        filters_digest = hashlib.md5(repr(filters).encode()).hexdigest()
+        cache_key = f'file_facets_{filters_digest}_v{get_search_cache_version()}'
+
+        facets = cache.get(cache_key)
+        if facets is None:
+            queryset = self.filter_by_size_and_date(File.objects.all())
+            counts = queryset.order_by().values('category').annotate(count=Count('id'))
+            facets = sorted((
+                {
+                    'file_type': CATEGORY_MIME_TYPES.get(row['category'], 'other'),
+                    'count': row['count'],
+                }
+                for row in counts
+            ), key=lambda facet: -facet['count'])
+            cache.set(cache_key, facets, timeout=FILE_COUNT_CACHE_TIMEOUT)
+
+        return Response({
+            'facets': facets,
+            'total': sum(facet['count'] for facet in facets),
+        })
+
+    def export_ndjson(self, queryset):
+        """Stream every matching file as one JSON object per line"""
+        serializer = self.get_serializer()
+        queryset = queryset.order_by(*self.pagination_class.ordering)
+
+        def rows():
+            for instance in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                yield json.dumps(serializer.to_representation(instance), cls=JSONEncoder) + '\n'
+
+        response = StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="files.ndjson"'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        logger.info(f"Listing files with params: {request.query_params}")
+        queryset = self.filter_listing(self.get_queryset())
+
+        if request.query_params.get('export') == 'ndjson':
+            return self.export_ndjson(queryset)
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
         return Response({
             'files': serializer.data,
-            'total': queryset.count()
+            'total': self.get_cached_count(queryset),
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link()
         })
 
     def create(self, request, *args, **kwargs):
@@ -155,24 +303,22 @@ class FileViewSet(viewsets.ModelViewSet):
         
         try:
             logger.info(f"Processing file upload: {file_obj.name}")
-            # Calculate hash using the original file object
-            file_hash = calculate_file_hash(file_obj)
-            file_obj.seek(0)  # Reset file pointer after hash calculation
+            # Staged uploads were hashed while streaming to disk
+            file_hash = getattr(file_obj, 'file_hash', None)
+            hash_algorithm = getattr(file_obj, 'hash_algorithm', None)
+            if file_hash is None:
+                hash_algorithm = get_hash_algorithm()
+                file_hash = calculate_file_hash(file_obj, hash_algorithm)
+                file_obj.seek(0)  # Reset file pointer after hash calculation
             
-            # Check for existing stored file
-            stored_file = StoredFile.objects.filter(file_hash=file_hash).first()
-            if stored_file:
-                logger.info(f"Duplicate file detected: {file_obj.name} (hash: {file_hash}) - Creating reference")
-                # Reference count will be incremented in File.save()
-            else:
+            stored_file, created = get_or_create_stored_file(file_obj, file_hash, hash_algorithm)
+            if created:
                 logger.info(f"New file detected: {file_obj.name} (hash: {file_hash})")
-                # Create new stored file
-                stored_file = StoredFile.objects.create(
-                    file=file_obj,
-                    file_hash=file_hash
-                )
+            else:
+                logger.info(f"Duplicate file detected: {file_obj.name} (hash: {file_hash}) - Creating reference")
             
-            # Create file record
+            # Create file record; File.save() adds its own reference, so the
+            # one claimed above is released either way
             data = {
                 'stored_file': stored_file.id,  # Pass the ID instead of the instance
                 'original_filename': file_obj.name,
@@ -180,15 +326,18 @@ class FileViewSet(viewsets.ModelViewSet):
                 'size': file_obj.size
             }
             
-            serializer = self.get_serializer(data=data)
-            serializer.is_valid(raise_exception=True)
-            self.perform_create(serializer)
+            try:
+                serializer = self.get_serializer(data=data)
+                serializer.is_valid(raise_exception=True)
+                self.perform_create(serializer)
+            finally:
+                release_stored_files([stored_file.id])
             
             logger.info(f"File uploaded successfully: {file_obj.name} (id: {serializer.data['id']})")
             return Response({
                 'id': serializer.data['id'],
                 'message': 'File uploaded successfully',
-                'is_reference': not stored_file.reference_count == 1
+                'is_reference': not created
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
@@ -197,6 +346,180 @@ class FileViewSet(viewsets.ModelViewSet):
                 'error': f'Error uploading file: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def probe(self, request):
+        """
+        Report which content hashes are already stored, so clients can skip
+        uploading those bodies and call create_reference instead.
+        """
+        hashes = request.data.get('hashes')
+        algorithm = request.data.get('algorithm') or get_hash_algorithm()
+        if not isinstance(hashes, list) or not all(isinstance(h, str) for h in hashes):
+            return Response({
+                'error': '"hashes" must be a list of hex digests'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(hashes) > MAX_PROBE_HASHES:
+            return Response({
+                'error': f'At most {MAX_PROBE_HASHES} hashes can be probed per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        hashes = {h.lower() for h in hashes}
+        existing = StoredFile.objects.filter(
+            hash_algorithm=algorithm, file_hash__in=hashes
+        ).values_list('file_hash', flat=True)
+
+        return Response({
+            'algorithm': algorithm,
+            'existing': sorted(existing)
+        })
+
+    @action(detail=False, methods=['post'])
+    def create_reference(self, request):
+        """
+        Create a file record for content the vault already stores, without
+        transferring the body.
+        """
+        file_hash = str(request.data.get('file_hash', '')).lower()
+        algorithm = request.data.get('algorithm') or get_hash_algorithm()
+        original_filename = request.data.get('original_filename')
+        if not file_hash or not original_filename:
+            return Response({
+                'error': '"file_hash" and "original_filename" are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Claimed so a concurrent delete of its last File cannot remove it
+        stored_file = next(iter(claim_stored_files(
+            list(StoredFile.objects.filter(hash_algorithm=algorithm, file_hash=file_hash)[:1])
+        )), None)
+        if stored_file is None:
+            return Response({
+                'error': 'No stored content matches this hash; upload the file instead'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        data = {
+            'stored_file': stored_file.id,
+            'original_filename': original_filename,
+            'file_type': request.data.get('file_type') or 'application/octet-stream',
+            # The stored content is authoritative for the size
+            'size': stored_file.size
+        }
+        try:
+            serializer = self.get_serializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        finally:
+            release_stored_files([stored_file.id])
+
+        logger.info(f"Reference created without upload: {original_filename} (hash: {file_hash})")
+        return Response({
+            'id': serializer.data['id'],
+            'message': 'File uploaded successfully',
+            'is_reference': True
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Upload several files in one multipart request (repeated "files"
+        field, at most DATA_UPLOAD_MAX_NUMBER_FILES). Stored content is
+        resolved with one query and new rows are bulk inserted; the
+        response reports each file in request order. Files that fail
+        validation are reported with their errors and nothing of them is
+        stored.
+        """
+        file_objs = request.FILES.getlist('files')
+        if not file_objs:
+            logger.warning("No files provided in batch upload request")
+            return Response({'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        started = time.monotonic()
+        keys = []
+        uploads = {}
+        invalid = {}
+        for index, file_obj in enumerate(file_objs):
+            # Validate each file's metadata as a single upload would, before
+            # any content is stored, so one bad file cannot fail the batch
+            serializer = self.get_serializer(data={
+                'original_filename': file_obj.name,
+                'file_type': file_obj.content_type,
+                'size': file_obj.size
+            }, partial=True)
+            if not serializer.is_valid():
+                invalid[index] = serializer.errors
+                keys.append(None)
+                file_obj.close()
+                continue
+
+            # Staged uploads were hashed while streaming to disk
+            file_hash = getattr(file_obj, 'file_hash', None)
+            hash_algorithm = getattr(file_obj, 'hash_algorithm', None)
+            if file_hash is None:
+                hash_algorithm = get_hash_algorithm()
+                file_hash = calculate_file_hash(file_obj, hash_algorithm)
+                file_obj.seek(0)
+            key = (hash_algorithm, file_hash)
+            keys.append(key)
+            # Repeated content within the batch is stored once
+            if key in uploads:
+                file_obj.close()
+            else:
+                uploads[key] = file_obj
+
+        try:
+            stored, errors = get_or_create_stored_files(uploads)
+            try:
+                with transaction.atomic():
+                    records = [
+                        File(stored_file=stored[key][0], original_filename=file_obj.name,
+                             file_type=file_obj.content_type, size=file_obj.size)
+                        for key, file_obj in zip(keys, file_objs) if key in stored
+                    ]
+                    bulk_create_files(records)
+            finally:
+                # The new Files hold their own references now
+                release_stored_files([stored_file.id for stored_file, _ in stored.values()])
+        except Exception as e:
+            logger.error(f"Error uploading batch of {len(file_objs)} files: {str(e)}")
+            return Response({
+                'error': f'Error uploading files: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        results = []
+        created_records = iter(records)
+        seen = set()
+        for index, (key, file_obj) in enumerate(zip(keys, file_objs)):
+            if index in invalid:
+                results.append({'original_filename': file_obj.name, 'errors': invalid[index]})
+                continue
+            if key in errors:
+                results.append({'original_filename': file_obj.name, 'error': f'Error uploading file: {errors[key]}'})
+                continue
+            record = next(created_records)
+            results.append({
+                'id': str(record.id),
+                'original_filename': file_obj.name,
+                'is_reference': key in seen or not stored[key][1]
+            })
+            seen.add(key)
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Batch upload: {len(records)} files stored, {len(file_objs) - len(records)} failed "
+                    f"in {elapsed:.2f}s ({len(file_objs) / max(elapsed, 1e-6):.0f} files/sec)")
+        return Response({
+            'results': results,
+            'uploaded': len(records),
+            'failed': len(file_objs) - len(records)
+        }, status=status.HTTP_201_CREATED if records else
+           status.HTTP_500_INTERNAL_SERVER_ERROR if errors else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download the file's content. Supports conditional requests (the ETag
+        is the content hash) and single byte ranges for resumable downloads.
+        """
+        return serve_file(request, self.get_object())
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         logger.info(f"Deleting file: {instance.original_filename} (id: {instance.id})")
@@ -204,9 +527,6 @@ class FileViewSet(viewsets.ModelViewSet):
         # Delete the database record (this will handle reference counting)
         self.perform_destroy(instance)
         
-        # Invalidate all search caches by incrementing the version
-        invalidate_search_cache()
-        
         logger.info(f"File deleted successfully: {instance.original_filename}")
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -215,80 +535,47 @@ class FileViewSet(viewsets.ModelViewSet):
         """
         Search for files using Elasticsearch with advanced search capabilities.
         """
+        started = time.monotonic()
         query = request.query_params.get('q', '').strip()
         if not query:
             return Response({
                 'error': 'Search query parameter "q" is required'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Convert query to lowercase to ensure case-insensitive search
+        # The index analyzers are case-insensitive; lowercasing here only lets
+        # differently-cased queries share a cache entry
         query = query.lower()
 
         # Generate cache key based on query, filters and cache version
         file_type = request.query_params.get('file_type', '')
         page = request.query_params.get('page', 1)
-        page_size = request.query_params.get('page_size', self.pagination_class.page_size)
+        page_size = request.query_params.get('page_size', FilePagination.page_size)
         cache_version = get_search_cache_version()
         cache_key = f'search_{query}_{file_type}_{page}_{page_size}_v{cache_version}'
         
         # Try to get cached results
         cached_results = cache.get(cache_key)
+        record_search_cache_lookup(hit=bool(cached_results))
         if cached_results:
-            logger.info(f"Returning cached search results for query: {query}")
+            log_search(query, file_type, page, page_size, (time.monotonic() - started) * 1000,
+                       hits=cached_results['total'], cache_hit=True)
             return Response(cached_results)
 
-        logger.info(f"Searching files with query: {query}")
-        
         # Build Elasticsearch query
-        search = FileDocument.search()
-        
-        # Add search query with multiple matching strategies
-        search = search.query(
-            Q('bool',
-              should=[
-                  Q('prefix', original_filename=query),
-                  Q('match_phrase', original_filename={'query': query, 'slop': 2}),
-                  Q('wildcard', original_filename={'value': f'*{query}*'}),
-                  Q('match', original_filename={'query': query, 'fuzziness': 'AUTO'})
-              ],
-              minimum_should_match=1)
-        )
-        
-        # Apply file type filter if provided
-        if file_type:
-            if '/' in file_type:
-                search = search.filter('term', file_type=file_type)
-            else:
-                mime_type = get_mime_type_from_extension(f'.{file_type}')
-                search = search.filter('term', file_type=mime_type)
-
-        # Apply pagination
-        start = (int(page) - 1) * int(page_size)
-        search = search[start:start + int(page_size)]
+        search = build_file_search(FileDocument.search(), query, file_type, int(page), int(page_size))
         
         # Execute search
         response = search.execute()
-        logger.info(f"Elasticsearch query: {search.to_dict()}")
-        logger.info(f"Elasticsearch response: {response.to_dict()}")
         
         # Get total count
         total = response.hits.total.value
-        logger.info(f"Total hits: {total}")
-        
-        # Get file IDs from search results
-        file_ids = [hit.meta.id for hit in response]
-        logger.info(f"Found file IDs: {file_ids}")
-        
-        # Get actual file objects
-        files = File.objects.filter(id__in=file_ids)
-        logger.info(f"Found files: {files}")
         
         # Serialize results
-        serializer = self.get_serializer(files, many=True)
+        files = serialize_search_hits(response, self.get_serializer_context())
         
         # Prepare response data
         response_data = {
-            'files': serializer.data,
+            'files': files,
             'total': total,
             'query': query,
             'page': int(page),
@@ -298,8 +585,39 @@ class FileViewSet(viewsets.ModelViewSet):
         # Cache the results for 5 minutes
         cache.set(cache_key, response_data, timeout=300)
         
+        log_search(query, file_type, page, page_size, (time.monotonic() - started) * 1000,
+                   took_ms=response.took, hits=total)
         return Response(response_data)
 
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Type-ahead filename suggestions from the completion suggester. Returns
+        only ids and filenames from the index; no database access.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({
+                'error': 'Query parameter "q" is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            size = min(max(int(request.query_params.get('size', SUGGEST_SIZE)), 1), MAX_SUGGEST_SIZE)
+        except ValueError:
+            return Response({
+                'error': 'size must be an integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        search = FileDocument.search().source(['original_filename']).extra(size=0)
+        search = search.suggest('filenames', query, completion={'field': 'suggest', 'size': size})
+        response = search.execute()
+
+        suggestions = [
+            {'id': option._id, 'original_filename': option._source.original_filename}
+            for option in response.suggest.filenames[0].options
+        ]
+        return Response({'query': query, 'suggestions': suggestions})
+
     @action(detail=False, methods=['get'])
     def storage_stats(self, request):
         """
@@ -311,27 +629,16 @@ class FileViewSet(viewsets.ModelViewSet):
         - Actual space used (with deduplication)
         - Space saved through deduplication
         """
-        # Get total file count
-        total_files = File.objects.count()
-        
-        # Get unique file count (StoredFile entries)
-        unique_files = StoredFile.objects.count()
+        counters = StorageStats.objects.filter(id=StorageStats.SINGLETON_ID).first() or StorageStats.reconcile()
+        total_files = counters.total_files
+        unique_files = counters.unique_files
         
         # Calculate duplicate references
         duplicate_files = total_files - unique_files
         
-        # Calculate total size if all files were stored individually
-        total_size = File.objects.aggregate(total=models.Sum('size'))['total'] or 0
-        
-        # Calculate actual storage used (sum of unique StoredFile sizes)
-        # We join to get the size from File model since that's where size is stored
-        stored_files = StoredFile.objects.all()
-        actual_size = 0
-        for stored_file in stored_files:
-            # Get the size from any file reference (they all have the same size)
-            file_ref = File.objects.filter(stored_file=stored_file).first()
-            if file_ref:
-                actual_size += file_ref.size
+        # Size if all files were stored individually vs. sum of unique StoredFile sizes
+        total_size = counters.total_size
+        actual_size = counters.actual_size
         
         # Calculate space saved
         space_saved = total_size - actual_size
@@ -351,3 +658,119 @@ class FileViewSet(viewsets.ModelViewSet):
         
         logger.info(f"Storage statistics: {stats}")
         return Response(stats)
+
+    @action(detail=False, methods=['get'])
+    def index_status(self, request):
+        """
+        Reports the search index outbox: pending tasks, tasks being retried
+        and the age of the oldest pending task (queue lag).
+        """
+        return Response(get_outbox_stats())
+
+    @action(detail=False, methods=['get'])
+    def search_cache_stats(self, request):
+        """
+        Reports search result cache hits, misses and hit ratio, shared by
+        all workers, plus the current cache version.
+        """
+        return Response(get_search_cache_stats())
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable uploads: create a session, PUT its parts (in any order, in
+    parallel), then complete it to store the file through the usual
+    deduplication path.
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+
+    def perform_create(self, serializer):
+        purge_expired_sessions(limit=EXPIRED_SESSION_PURGE_LIMIT)
+        session = serializer.save()
+        logger.info(f"Upload session {session.id} started for {session.original_filename} ({session.size} bytes)")
+
+    def perform_destroy(self, instance):
+        logger.info(f"Upload session {instance.id} aborted")
+        discard_session(instance)
+
+    def get_live_session(self):
+        session = self.get_object()
+        if session.expires_at <= timezone.now():
+            discard_session(session)
+            return None
+        return session
+
+    @action(detail=True, methods=['put'], url_path=r'parts/(?P<part_number>\d+)')
+    def part(self, request, pk=None, part_number=None):
+        """Receive one part as the raw request body (zero-based part number)"""
+        session = self.get_live_session()
+        if session is None:
+            return Response({'error': 'Upload session has expired'}, status=status.HTTP_410_GONE)
+
+        if session.completing:
+            return Response({'error': 'Upload session is being completed'}, status=status.HTTP_409_CONFLICT)
+
+        part_number = int(part_number)
+        if part_number >= session.part_count:
+            return Response({
+                'error': f'Part number must be below {session.part_count}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            written = write_session_part(session, part_number, request.stream or io.BytesIO())
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'part_number': part_number, 'size': written})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Assemble the parts and store the file"""
+        session = self.get_live_session()
+        if session is None:
+            return Response({'error': 'Upload session has expired'}, status=status.HTTP_410_GONE)
+
+        # Claim the session, so a concurrent or retried complete cannot
+        # store the file a second time
+        claimed = UploadSession.objects.filter(id=session.id, completing=False).update(completing=True)
+        if not claimed:
+            return Response({'error': 'Upload session is already being completed'}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            staged = assemble_session(session)
+        except ValueError as e:
+            UploadSession.objects.filter(id=session.id).update(completing=False)
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except BaseException:
+            UploadSession.objects.filter(id=session.id).update(completing=False)
+            raise
+
+        try:
+            stored_file, created = get_or_create_stored_file(staged, staged.file_hash, staged.hash_algorithm)
+            try:
+                serializer = FileSerializer(data={
+                    'stored_file': stored_file.id,
+                    'original_filename': session.original_filename,
+                    'file_type': session.file_type,
+                    'size': session.size
+                }, context=self.get_serializer_context())
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            finally:
+                release_stored_files([stored_file.id])
+        except BaseException:
+            UploadSession.objects.filter(id=session.id).update(completing=False)
+            raise
+        finally:
+            staged.close()
+
+        discard_session(session)
+        logger.info(f"Upload session {session.id} completed: {session.original_filename} (hash: {staged.file_hash})")
+        return Response({
+            'id': serializer.data['id'],
+            'message': 'File uploaded successfully',
+            'is_reference': not created
+        }, status=status.HTTP_201_CREATED)
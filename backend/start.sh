@@ -1,25 +1,91 @@
 #!/bin/sh
 
+# BOOT_MODE=fresh (default) wipes the database and media on every start.
+# BOOT_MODE=fast keeps all data, migrates only when the schema is behind
+# and reindexes only when the search index is out of date.
+BOOT_MODE=${BOOT_MODE:-fresh}
+# SERVER=gunicorn (default) serves WSGI with sync workers.
+# SERVER=uvicorn serves ASGI with uvicorn workers and async search/download views.
+SERVER=${SERVER:-gunicorn}
+BOOT_START=$(date +%s.%N)
+
+# Run a boot phase and log how long it took
+timed() {
+    phase=$1
+    shift
+    phase_start=$(date +%s.%N)
+    "$@"
+    phase_status=$?
+    echo "[boot] $phase: $(awk "BEGIN { printf \"%.2f\", $(date +%s.%N) - $phase_start }")s"
+    return $phase_status
+}
+
+echo "Boot mode: $BOOT_MODE"
+
 # Run cleanup first
-./cleanup.sh
+if [ "$BOOT_MODE" = "fresh" ]; then
+    timed "cleanup" ./cleanup.sh
+fi
 
 # Wait for Elasticsearch to be ready
-echo "Waiting for Elasticsearch..."
-until curl -s http://elasticsearch:9200/_cluster/health | grep -q '"status":"green\|yellow"'; do
-    echo "Elasticsearch is unavailable - sleeping"
-    sleep 2
-done
-echo "Elasticsearch is ready!"
+wait_for_elasticsearch() {
+    echo "Waiting for Elasticsearch..."
+    until curl -s http://elasticsearch:9200/_cluster/health | grep -q '"status":"green\|yellow"'; do
+        echo "Elasticsearch is unavailable - sleeping"
+        sleep 2
+    done
+    echo "Elasticsearch is ready!"
+}
+timed "elasticsearch" wait_for_elasticsearch
 
 # Run migrations if needed
-python manage.py migrate
+migrate_if_needed() {
+    if python manage.py migrate --check > /dev/null 2>&1; then
+        echo "Database schema is up to date"
+    else
+        python manage.py migrate
+    fi
+}
+timed "migrate" migrate_if_needed
+
+if [ "$BOOT_MODE" = "fresh" ]; then
+    # Build a fresh index version and swap the alias over to it
+    echo "Setting up Elasticsearch indices..."
+    timed "index" python manage.py rebuild_index
+else
+    # Reindex only if the mapping changed or the index disagrees with the database
+    echo "Checking Elasticsearch indices..."
+    timed "index" python manage.py rebuild_index --if-stale
+fi
+
+# Drain queued search index updates in the background, restarting the
+# worker if it ever exits
+echo "Starting search index worker..."
+(
+    while true; do
+        python manage.py process_index_outbox
+        echo "Search index worker exited with status $?, restarting in 5s"
+        sleep 5
+    done
+) &
+
+# Purge expired upload sessions and abandoned staged uploads every
+# UPLOAD_CLEANUP_INTERVAL seconds (default: hourly)
+UPLOAD_CLEANUP_INTERVAL=${UPLOAD_CLEANUP_INTERVAL:-3600}
+echo "Starting upload cleanup loop (every ${UPLOAD_CLEANUP_INTERVAL}s)..."
+(
+    while true; do
+        sleep "$UPLOAD_CLEANUP_INTERVAL"
+        python manage.py cleanup_upload_sessions || echo "Upload cleanup exited with status $?"
+    done
+) &
 
-# Create/Update Elasticsearch indices
-echo "Setting up Elasticsearch indices..."
-python manage.py search_index --delete || true  # Delete existing index if it exists
-python manage.py search_index --create  # Create fresh index
-python manage.py search_index --rebuild -f  # Rebuild index with existing data
+echo "[boot] total: $(awk "BEGIN { printf \"%.2f\", $(date +%s.%N) - $BOOT_START }")s"
 
-# Start the Django development server
-echo "Starting Django server..."
-exec gunicorn --bind 0.0.0.0:8000 core.wsgi:application 
\ No newline at end of file
+# Start the Django server
+echo "Starting Django server ($SERVER)..."
+if [ "$SERVER" = "uvicorn" ]; then
+    export ASYNC_VIEWS=True
+    exec gunicorn --bind 0.0.0.0:8000 -k uvicorn.workers.UvicornWorker core.asgi:application
+fi
+exec gunicorn --bind 0.0.0.0:8000 core.wsgi:application
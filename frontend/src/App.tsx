@@ -4,7 +4,7 @@ import { QueryClient, QueryClientProvider, useQueryClient } from '@tanstack/reac
 import { ReactQueryDevtools } from '@tanstack/react-query-devtools';
 import { FileList } from './components/FileList';
 import { FileUpload } from './components/FileUpload';
-import { FileUploadResponse, ApiError } from './types/file';
+import { FileUploadResponse, BatchUploadResponse, ApiError } from './types/file';
 import FileVaultImageIcon from './components/icons/FileVaultImageIcon';
 import { StorageStatsCard } from './components/StorageStatsCard';
 
@@ -14,7 +14,7 @@ const queryClient = new QueryClient();
 const AppContent: React.FC = () => {
   const queryClient = useQueryClient();
 
-  const handleUploadSuccess = (response: FileUploadResponse) => {
+  const handleUploadSuccess = (response: FileUploadResponse | BatchUploadResponse) => {
     console.log('Upload successful:', response);
     // Invalidate storage stats when a file is uploaded
     queryClient.invalidateQueries({ queryKey: ['storageStats'] });
@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { useFiles } from '../hooks/useFiles';
+import { useFiles, useFileSuggestions } from '../hooks/useFiles';
 import { FileFilters } from './FileFilters';
 import { format } from 'date-fns';
 import { FileMetadata } from '../types/file';
@@ -29,6 +29,8 @@ export const FileList: React.FC<FileListProps> = ({ onDeleteFile }) => {
     error,
     searchQuery,
     setSearchQuery,
+    submittedQuery,
+    submitSearch,
     filters,
     setFilters,
     uploadFile,
@@ -37,9 +39,17 @@ export const FileList: React.FC<FileListProps> = ({ onDeleteFile }) => {
     deleteFile,
     isDeleting,
     deleteError,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
   } = useFiles();
 
   const [selectedFile, setSelectedFile] = useState<FileMetadata | null>(null);
+  const [showSuggestions, setShowSuggestions] = useState(false);
+  const { data: suggestData } = useFileSuggestions(showSuggestions ? searchQuery : '');
+  const suggestions = (suggestData?.suggestions || []).filter(
+    (suggestion) => suggestion.original_filename !== searchQuery
+  );
 
   const handleDelete = async (fileId: string) => {
     try {
@@ -64,7 +74,18 @@ export const FileList: React.FC<FileListProps> = ({ onDeleteFile }) => {
                 type="text"
                 placeholder="Search files..."
                 value={searchQuery}
-                onChange={(e) => setSearchQuery(e.target.value)}
+                onChange={(e) => {
+                  setSearchQuery(e.target.value);
+                  setShowSuggestions(true);
+                }}
+                onKeyDown={(e) => {
+                  if (e.key === 'Enter') {
+                    submitSearch();
+                    setShowSuggestions(false);
+                  }
+                }}
+                onFocus={() => setShowSuggestions(true)}
+                onBlur={() => setShowSuggestions(false)}
                 className="block w-full rounded-md border-2 border-gray-300 shadow-sm focus:border-blue-500 focus:ring-2 focus:ring-blue-500 focus:ring-opacity-50 px-4 py-2 text-gray-700 placeholder-gray-400 bg-white transition-colors duration-200"
               />
               <div className="absolute inset-y-0 right-0 flex items-center pr-3 pointer-events-none">
@@ -72,6 +93,25 @@ export const FileList: React.FC<FileListProps> = ({ onDeleteFile }) => {
                   <path fillRule="evenodd" d="M8 4a4 4 0 100 8 4 4 0 000-8zM2 8a6 6 0 1110.89 3.476l4.817 4.817a1 1 0 01-1.414 1.414l-4.816-4.816A6 6 0 012 8z" clipRule="evenodd" />
                 </svg>
               </div>
+              {showSuggestions && suggestions.length > 0 && (
+                <ul className="absolute left-0 right-0 mt-1 bg-white border border-gray-200 rounded-md shadow-lg max-h-60 overflow-y-auto">
+                  {suggestions.map((suggestion) => (
+                    <li
+                      key={suggestion.id}
+                      // mousedown fires before the input's blur hides the list
+                      onMouseDown={(e) => {
+                        e.preventDefault();
+                        setSearchQuery(suggestion.original_filename);
+                        submitSearch(suggestion.original_filename);
+                        setShowSuggestions(false);
+                      }}
+                      className="px-4 py-2 text-sm text-gray-700 cursor-pointer hover:bg-blue-50 truncate"
+                    >
+                      {suggestion.original_filename}
+                    </li>
+                  ))}
+                </ul>
+              )}
             </div>
           </div>
         </div>
@@ -95,7 +135,7 @@ export const FileList: React.FC<FileListProps> = ({ onDeleteFile }) => {
               </li>
             ) : files.length === 0 ? (
               <li className="px-4 py-4 text-center text-gray-500">
-                {searchQuery || filters.fileType || filters.minSize || filters.maxSize || filters.startDate || filters.endDate 
+                {submittedQuery || filters.fileType || filters.minSize || filters.maxSize || filters.startDate || filters.endDate 
                   ? "No items match your search criteria" 
                   : "No files uploaded yet"}
               </li>
@@ -150,6 +190,17 @@ export const FileList: React.FC<FileListProps> = ({ onDeleteFile }) => {
                 </li>
               ))
             )}
+            {hasNextPage && (
+              <li className="px-4 py-3 text-center">
+                <button
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                  className="text-blue-600 hover:text-blue-900 disabled:opacity-50"
+                >
+                  {isFetchingNextPage ? 'Loading...' : 'Load more'}
+                </button>
+              </li>
+            )}
           </ul>
         </div>
       </div>
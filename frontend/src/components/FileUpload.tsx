@@ -1,11 +1,11 @@
 import React, { useCallback, useState } from 'react';
 import { useDropzone } from 'react-dropzone';
-import { uploadFile, isApiError } from '../services/api';
+import { uploadFile, uploadFiles, isApiError } from '../services/api';
 import { useFiles } from '../hooks/useFiles';
-import { FileUploadResponse } from '../types/file';
+import { FileUploadResponse, BatchUploadResponse } from '../types/file';
 
 interface FileUploadProps {
-  onUploadSuccess: (response: FileUploadResponse) => void;
+  onUploadSuccess: (response: FileUploadResponse | BatchUploadResponse) => void;
 }
 
 export const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess }) => {
@@ -19,6 +19,19 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess }) => {
 
     setIsUploading(true);
     try {
+      if (acceptedFiles.length > 1) {
+        const batch = await uploadFiles(acceptedFiles);
+        await refetch();
+        setMessage({
+          type: batch.failed ? 'error' : 'success',
+          text: batch.failed
+            ? `Uploaded ${batch.uploaded} files, ${batch.failed} failed`
+            : `Uploaded ${batch.uploaded} files successfully`
+        });
+        onUploadSuccess(batch);
+        return;
+      }
+
       const response = await uploadFile(file);
       // Refresh the file list after successful upload
       await refetch();
@@ -84,7 +97,6 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess }) => {
       'application/toml': ['.toml'],
       'application/octet-stream': ['.dat', '.bin', '.exe', '.dll', '.so', '.dylib', '.class', '.jar', '.war', '.ear', '.apk', '.ipa', '.deb', '.rpm', '.iso', '.img', '.dmg', '.vhd', '.vhdx', '.ova', '.ovf', '.vmdk', '.qcow2', '.raw', '.vdi']
     },
-    maxFiles: 1,
   });
 
   return (
@@ -98,10 +110,10 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess }) => {
         {isUploading ? (
           <p className="text-gray-600">Uploading...</p>
         ) : isDragActive ? (
-          <p className="text-blue-600">Drop the file here...</p>
+          <p className="text-blue-600">Drop the files here...</p>
         ) : (
           <p className="text-gray-600">
-            Drag and drop a file here, or click to select a file
+            Drag and drop files here, or click to select files
           </p>
         )}
       </div>
@@ -1,6 +1,6 @@
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { uploadFile, getFiles, getFileDetails, deleteFile, searchFiles } from '../services/api';
-import { FileMetadata, FileListResponse, FileUploadResponse, FileSearchResponse, ApiError } from '../types/file';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { uploadFile, getFiles, getFilesPage, getFileDetails, deleteFile, searchFiles, getSuggestions } from '../services/api';
+import { FileMetadata, FileListResponse, FileUploadResponse, FileSearchResponse, FileSuggestResponse, ApiError } from '../types/file';
 import { useState, useEffect } from 'react';
 
 // Custom hook for debouncing
@@ -23,6 +23,9 @@ const useDebounce = <T,>(value: T, delay: number): T => {
 export const useFiles = () => {
   const queryClient = useQueryClient();
   const [searchQuery, setSearchQuery] = useState<string>('');
+  // The full search runs only for a submitted query; while typing, only
+  // the cheap suggest endpoint is called (useFileSuggestions)
+  const [submittedQuery, setSubmittedQuery] = useState<string>('');
   const [filters, setFilters] = useState({
     fileType: '',
     minSize: '',
@@ -31,16 +34,29 @@ export const useFiles = () => {
     endDate: '',
   });
 
-  const debouncedSearchQuery = useDebounce(searchQuery, 300);
   const debouncedFilters = useDebounce(filters, 300);
 
-  // Query for listing all files or searching files
-  const { data: files, isLoading, error, refetch } = useQuery<FileListResponse | FileSearchResponse, ApiError>({
-    queryKey: ['files', 'list', debouncedSearchQuery, debouncedFilters],
-    queryFn: () => {
+  // Query for listing all files or searching files; listings are fetched one cursor page at a time
+  const {
+    data,
+    isLoading,
+    error,
+    refetch,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery<FileListResponse | FileSearchResponse, ApiError>({
+    queryKey: ['files', 'list', submittedQuery, debouncedFilters],
+    initialPageParam: null,
+    getNextPageParam: (lastPage) => ('next' in lastPage ? lastPage.next : null) || undefined,
+    queryFn: ({ pageParam }) => {
+      if (pageParam) {
+        // The cursor link already carries the active filters
+        return getFilesPage(pageParam as string);
+      }
       const params = new URLSearchParams();
-      if (debouncedSearchQuery) {
-        params.append('q', debouncedSearchQuery);
+      if (submittedQuery) {
+        params.append('q', submittedQuery);
       }
       if (debouncedFilters.fileType) {
         console.log('Setting file type filter:', debouncedFilters.fileType);
@@ -64,8 +80,8 @@ export const useFiles = () => {
         params.append('end_date', debouncedFilters.endDate);
       }
       console.log('Query params:', params.toString());
-      return debouncedSearchQuery ? 
-        searchFiles(debouncedSearchQuery, params) : 
+      return submittedQuery ? 
+        searchFiles(submittedQuery, params) : 
         getFiles(params);
     },
     retry: 1,
@@ -84,7 +100,7 @@ export const useFiles = () => {
       
       // Invalidate and refetch with current filters
       await queryClient.invalidateQueries({
-        queryKey: ['files', 'list', debouncedSearchQuery, debouncedFilters],
+        queryKey: ['files', 'list', submittedQuery, debouncedFilters],
         refetchType: 'active',
         exact: true
       });
@@ -150,17 +166,30 @@ export const useFiles = () => {
     }
   };
 
+  const files = data?.pages.flatMap((page) => page.files) || [];
+
   return {
     // List operations
-    files: files?.files || [],
-    totalFiles: files?.total || 0,
+    files,
+    totalFiles: data?.pages[0]?.total || 0,
     isLoading,
     error,
     refetch,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
 
     // Search operations
     searchQuery,
-    setSearchQuery,
+    setSearchQuery: (query: string) => {
+      setSearchQuery(query);
+      // Clearing the box goes straight back to the listing
+      if (!query.trim()) {
+        setSubmittedQuery('');
+      }
+    },
+    submittedQuery,
+    submitSearch: (query: string = searchQuery) => setSubmittedQuery(query.trim()),
 
     // Filter operations
     filters,
@@ -181,6 +210,19 @@ export const useFiles = () => {
   };
 };
 
+// Type-ahead filename suggestions; far cheaper than a full search, so they follow typing closely
+export const useFileSuggestions = (query: string) => {
+  const debouncedQuery = useDebounce(query.trim(), 100);
+
+  return useQuery<FileSuggestResponse, ApiError>({
+    queryKey: ['files', 'suggest', debouncedQuery],
+    queryFn: ({ signal }) => getSuggestions(debouncedQuery, signal),
+    enabled: debouncedQuery.length > 0,
+    staleTime: 30000,
+    retry: false,
+  });
+};
+
 // Separate hook for getting file details
 export const useFileDetails = (id: string) => {
   const queryClient = useQueryClient();
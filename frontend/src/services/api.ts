@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { FileMetadata, FileUploadResponse, FileListResponse, FileSearchResponse, StorageStats } from '../types/file';
+import { FileMetadata, FileUploadResponse, BatchUploadResponse, FileListResponse, FileSearchResponse, FileSuggestResponse, StorageStats } from '../types/file';
 import { fileService } from './fileService';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
@@ -41,12 +41,20 @@ export const uploadFile = async (file: globalThis.File): Promise<FileUploadRespo
   return fileService.uploadFile(file);
 };
 
+export const uploadFiles = async (files: globalThis.File[]): Promise<BatchUploadResponse> => {
+  return fileService.uploadFiles(files);
+};
+
 export const getFiles = async (params?: URLSearchParams): Promise<FileListResponse> => {
   const url = '/files/';
   const response = await fileService.listFiles(url, params);
   return response;
 };
 
+export const getFilesPage = async (cursorUrl: string): Promise<FileListResponse> => {
+  return fileService.listFiles(cursorUrl);
+};
+
 export const getFileDetails = async (id: string): Promise<FileMetadata> => {
   return fileService.getFileDetails(id);
 };
@@ -62,6 +70,10 @@ export const searchFiles = async (query: string, params?: URLSearchParams): Prom
   return fileService.searchFiles(url, searchParams);
 };
 
+export const getSuggestions = async (query: string, signal?: AbortSignal): Promise<FileSuggestResponse> => {
+  return fileService.getSuggestions(query, signal);
+};
+
 export const getStorageStats = async (): Promise<StorageStats> => {
   return fileService.getStorageStats();
 }; 
\ No newline at end of file
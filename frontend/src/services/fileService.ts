@@ -1,8 +1,19 @@
 import axios from 'axios';
-import { FileMetadata, FileUploadResponse, FileListResponse, FileSearchResponse, ApiError, StorageStats } from '../types/file';
+import { FileMetadata, FileUploadResponse, BatchUploadResponse, FileListResponse, FileSearchResponse, FileSuggestResponse, ApiError, StorageStats, ProbeResponse, UploadSession } from '../types/file';
+import { CLIENT_HASH_ALGORITHM, canHashFile, hashFile } from '../utils/hash';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
+// Files larger than this go through a resumable upload session
+const RESUMABLE_UPLOAD_THRESHOLD = 64 * 1024 * 1024;
+// Parts of a resumable upload sent in parallel, and attempts per part
+const PART_UPLOAD_CONCURRENCY = 4;
+const PART_UPLOAD_ATTEMPTS = 3;
+// Files up to this size are sent together through /files/batch/, at most
+// BATCH_UPLOAD_SIZE per request (the backend's DATA_UPLOAD_MAX_NUMBER_FILES)
+const BATCH_UPLOAD_MAX_FILE_SIZE = 1024 * 1024;
+const BATCH_UPLOAD_SIZE = 100;
+
 const api = axios.create({
   baseURL: API_URL,
   headers: {
@@ -24,7 +35,48 @@ export const fileService = {
     }
   },
 
+  probeHashes: async (hashes: string[]): Promise<ProbeResponse> => {
+    try {
+      const response = await api.post('/files/probe/', { hashes, algorithm: CLIENT_HASH_ALGORITHM });
+      return response.data;
+    } catch (error) {
+      throw handleApiError(error);
+    }
+  },
+
+  createReference: async (file: globalThis.File, fileHash: string): Promise<FileUploadResponse> => {
+    try {
+      const response = await api.post('/files/create_reference/', {
+        file_hash: fileHash,
+        algorithm: CLIENT_HASH_ALGORITHM,
+        original_filename: file.name,
+        file_type: file.type,
+      });
+      return response.data;
+    } catch (error) {
+      throw handleApiError(error);
+    }
+  },
+
   uploadFile: async (file: globalThis.File): Promise<FileUploadResponse> => {
+    // Skip sending the body when the vault already has this content
+    if (canHashFile(file)) {
+      try {
+        const fileHash = await hashFile(file);
+        const { existing } = await fileService.probeHashes([fileHash]);
+        if (existing.includes(fileHash)) {
+          return await fileService.createReference(file, fileHash);
+        }
+      } catch (error) {
+        // Fall back to a regular upload if probing fails
+        console.error('Dedup probe failed:', error);
+      }
+    }
+
+    if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+      return fileService.uploadFileResumable(file);
+    }
+
     try {
       const formData = new FormData();
       formData.append('file', file);
@@ -39,6 +91,85 @@ export const fileService = {
     }
   },
 
+  uploadFiles: async (files: globalThis.File[]): Promise<BatchUploadResponse> => {
+    const small = files.filter((file) => file.size <= BATCH_UPLOAD_MAX_FILE_SIZE);
+    const large = files.filter((file) => file.size > BATCH_UPLOAD_MAX_FILE_SIZE);
+    const combined: BatchUploadResponse = { results: [], uploaded: 0, failed: 0 };
+
+    try {
+      for (let start = 0; start < small.length; start += BATCH_UPLOAD_SIZE) {
+        const formData = new FormData();
+        small.slice(start, start + BATCH_UPLOAD_SIZE).forEach((file) => formData.append('files', file));
+        const { data } = await api.post<BatchUploadResponse>('/files/batch/', formData, {
+          headers: {
+            'Content-Type': 'multipart/form-data',
+          },
+        });
+        combined.results.push(...data.results);
+        combined.uploaded += data.uploaded;
+        combined.failed += data.failed;
+      }
+    } catch (error) {
+      throw handleApiError(error);
+    }
+
+    // Large files keep the single-file path (dedup probe, resumable sessions)
+    for (const file of large) {
+      try {
+        const response = await fileService.uploadFile(file);
+        combined.results.push({ id: response.id, original_filename: file.name, is_reference: response.is_reference });
+        combined.uploaded += 1;
+      } catch (error) {
+        combined.results.push({ original_filename: file.name, error: (error as ApiError).message });
+        combined.failed += 1;
+      }
+    }
+    return combined;
+  },
+
+  uploadFileResumable: async (file: globalThis.File): Promise<FileUploadResponse> => {
+    try {
+      const { data: session } = await api.post<UploadSession>('/uploads/', {
+        original_filename: file.name,
+        file_type: file.type || 'application/octet-stream',
+        size: file.size,
+      });
+
+      const sendPart = async (partNumber: number): Promise<void> => {
+        const start = partNumber * session.part_size;
+        const body = file.slice(start, Math.min(start + session.part_size, file.size));
+        for (let attempt = 1; ; attempt++) {
+          try {
+            await api.put(`/uploads/${session.id}/parts/${partNumber}/`, body, {
+              headers: { 'Content-Type': 'application/octet-stream' },
+            });
+            return;
+          } catch (error) {
+            if (attempt >= PART_UPLOAD_ATTEMPTS) {
+              throw error;
+            }
+          }
+        }
+      };
+
+      // A small pool of workers pulls the next pending part until none are left
+      let nextPart = 0;
+      const worker = async () => {
+        while (nextPart < session.part_count) {
+          await sendPart(nextPart++);
+        }
+      };
+      await Promise.all(
+        Array.from({ length: Math.min(PART_UPLOAD_CONCURRENCY, session.part_count) }, worker)
+      );
+
+      const response = await api.post(`/uploads/${session.id}/complete/`);
+      return response.data;
+    } catch (error) {
+      throw handleApiError(error);
+    }
+  },
+
   getFileDetails: async (id: string): Promise<FileMetadata> => {
     try {
       const response = await api.get(`/files/${id}/`);
@@ -68,20 +199,15 @@ export const fileService = {
 
   async downloadFile(fileUrl: string, filename: string): Promise<void> {
     try {
-      const response = await axios.get(fileUrl, {
-        responseType: 'blob',
-      });
-      
-      // Create a blob URL and trigger download
-      const blob = new Blob([response.data]);
-      const url = window.URL.createObjectURL(blob);
+      // Let the browser fetch the download endpoint itself: the file streams
+      // straight to disk instead of into memory, and interrupted downloads
+      // can resume with Range requests
       const link = document.createElement('a');
-      link.href = url;
+      link.href = fileUrl;
       link.download = filename;
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);
-      window.URL.revokeObjectURL(url);
     } catch (error) {
       console.error('Download error:', error);
       throw new Error('Failed to download file');
@@ -100,6 +226,15 @@ export const fileService = {
     }
   },
 
+  getSuggestions: async (query: string, signal?: AbortSignal): Promise<FileSuggestResponse> => {
+    try {
+      const response = await api.get('/files/suggest/', { params: { q: query }, signal });
+      return response.data;
+    } catch (error) {
+      throw handleApiError(error);
+    }
+  },
+
   getStorageStats: async (): Promise<StorageStats> => {
     try {
       const response = await api.get('/files/storage_stats/');
@@ -25,9 +25,41 @@ export interface FileUploadResponse {
   };
 }
 
+export interface BatchUploadResult {
+  id?: string;
+  original_filename: string;
+  is_reference?: boolean;
+  error?: string;
+}
+
+export interface BatchUploadResponse {
+  results: BatchUploadResult[];
+  uploaded: number;
+  failed: number;
+}
+
+export interface UploadSession {
+  id: string;
+  original_filename: string;
+  file_type: string;
+  size: number;
+  part_size: number;
+  part_count: number;
+  received_parts: number[];
+  created_at: string;
+  expires_at: string;
+}
+
+export interface ProbeResponse {
+  algorithm: string;
+  existing: string[];
+}
+
 export interface FileListResponse {
   files: FileMetadata[];
   total: number;
+  next: string | null;
+  previous: string | null;
 }
 
 export interface FileSearchResponse {
@@ -36,6 +68,16 @@ export interface FileSearchResponse {
   query: string;
 }
 
+export interface FileSuggestion {
+  id: string;
+  original_filename: string;
+}
+
+export interface FileSuggestResponse {
+  query: string;
+  suggestions: FileSuggestion[];
+}
+
 export interface ApiError {
   message: string;
   status: number;
@@ -0,0 +1,34 @@
+import { Sha256 } from './sha256';
+
+// Files above this size are uploaded without probing, since hashing them
+// in the browser would delay the upload by more than it could save.
+export const MAX_CLIENT_HASH_SIZE = 512 * 1024 * 1024;
+
+// Larger files are read and hashed one slice of this size at a time, so
+// only a single slice is held in memory
+const HASH_CHUNK_SIZE = 4 * 1024 * 1024;
+
+// Hash algorithm the backend uses by default (FILE_HASH_ALGORITHM)
+export const CLIENT_HASH_ALGORITHM = 'sha256';
+
+export const canHashFile = (file: globalThis.File): boolean => {
+  return typeof window !== 'undefined' && !!window.crypto?.subtle && file.size <= MAX_CLIENT_HASH_SIZE;
+};
+
+const digestFile = async (file: globalThis.File): Promise<Uint8Array> => {
+  if (file.size <= HASH_CHUNK_SIZE) {
+    return new Uint8Array(await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer()));
+  }
+  const hasher = new Sha256();
+  for (let offset = 0; offset < file.size; offset += HASH_CHUNK_SIZE) {
+    hasher.update(new Uint8Array(await file.slice(offset, offset + HASH_CHUNK_SIZE).arrayBuffer()));
+  }
+  return hasher.digest();
+};
+
+export const hashFile = async (file: globalThis.File): Promise<string> => {
+  const digest = await digestFile(file);
+  return Array.from(digest)
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+};